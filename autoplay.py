@@ -0,0 +1,101 @@
+"""
+Avto-ijro (autoplay) rejalashtiruvchisi.
+
+Har bir chat uchun alohida uxlab yotgan task o'rniga bitta korutina
+(due_time, chat_id) min-heap bo'yicha navbatdagi videoga o'tkazadi.
+Yoqish/o'chirish O(log n): o'chirilgan yoki qayta rejalashtirilgan
+yozuvlar heapdan darhol olinmaydi, navbati kelganda tashlab yuboriladi.
+Bir vaqtda ishlaydigan tahrirlar soni `max_concurrent` bilan cheklanadi.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class AutoplayScheduler:
+    """
+    `advance(chat_id)` shows the next video and returns the delay in
+    seconds until the one after it, or None to stop autoplay for the chat.
+    """
+
+    def __init__(self, advance: Callable[[int], Awaitable[Optional[float]]], max_concurrent: int = 20):
+        self.advance = advance
+        self.max_concurrent = max_concurrent
+        self._heap = []        # (due, seq, chat_id)
+        self._current = {}     # chat_id -> seq of its live heap entry
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._running = set()  # in-flight advance tasks
+        self._task = None
+
+    def schedule(self, chat_id: int, delay: float):
+        """(Re)schedule `chat_id` to advance after `delay` seconds"""
+        seq = next(self._seq)
+        self._current[chat_id] = seq
+        due = time.monotonic() + delay
+        heapq.heappush(self._heap, (due, seq, chat_id))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()  # yangi yozuv eng erta - loop kutishini qisqartiradi
+
+    def cancel(self, chat_id: int):
+        self._current.pop(chat_id, None)
+
+    def __contains__(self, chat_id: int):
+        return chat_id in self._current
+
+    def __len__(self):
+        return len(self._current)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._running)
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            # Bekor qilingan yozuvlarni tashlab yuborish
+            while self._heap and self._current.get(self._heap[0][2]) != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, seq, chat_id = heapq.heappop(self._heap)
+            await self._slots.acquire()
+            task = asyncio.create_task(self._advance(chat_id, seq))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _advance(self, chat_id: int, seq: int):
+        try:
+            delay = await self.advance(chat_id)
+        except Exception as e:
+            log.warning("Autoplay advance failed for %s: %s", chat_id, e)
+            delay = None
+        finally:
+            self._slots.release()
+        # Tahrir paytida o'chirilgan yoki qo'lda qayta rejalashtirilgan bo'lsa, tegmaymiz
+        if self._current.get(chat_id) != seq:
+            return
+        if delay is None:
+            del self._current[chat_id]
+        else:
+            self.schedule(chat_id, delay)
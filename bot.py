@@ -15,23 +15,38 @@ Funktsiyalar:
 """
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, time as dtime
-import aiohttp
 import aiosqlite
 from openpyxl import Workbook
 import os
-import json
-import re
 from typing import Optional, Callable, Dict, Any, Awaitable
 
 from db import (
-    init_db, add_user, get_user, get_all_users, get_all_user_ids, 
-    count_users, count_active_users, add_admin, remove_admin, 
-    get_all_admins, is_admin_db, add_duo, list_duos, delete_duo, 
-    increment_duo_stat, get_top_duos, add_ad, update_ad_sent_count, 
-    set_meta, get_meta, set_user_region
+    init_db, add_user, get_user, get_all_users,
+    count_users, count_active_since, add_admin, remove_admin, 
+    get_all_admins, is_admin_db, page_admins, page_duos, page_videos,
+    get_top_duos, add_ad, update_ad_sent_count, 
+    get_meta, set_user_region,
+    create_broadcast_job, get_broadcast_job, get_broadcast_job_by_key,
+    get_unfinished_broadcast_jobs, set_broadcast_job_status, prune_broadcast_deliveries,
+    open_db, close_db, save_prayer_times, load_prayer_times,
+    import_videos_json
 )
 from ramadan_times import get_ramadan_times
+from prayer_calc import calculated_times, max_drift
+from broadcast import AdaptivePacer, run_job
+from trackers import ActivityTracker, DuoOpenCounter
+from http_client import open_http, close_http
+from cache import TTLCache, SingleFlight, DailyMemo
+from video_catalog import VideoCatalog
+from autoplay import AutoplayScheduler
+from sessions import SessionStore
+from throttle import ThrottleMiddleware
+from duo_catalog import DuoCatalog
+from prayer_sources import (
+    CircuitBreaker, IslomSource, NamozVaqtiSource, AladhanSource, SourcePipeline
+)
 
 from dotenv import load_dotenv
 load_dotenv()  # load .env from project root
@@ -57,8 +72,8 @@ class UserActivityMiddleware(BaseMiddleware):
     ) -> Any:
         user = data.get("event_from_user")
         if user:
-            # We just track activity, no heavy updates
-            pass 
+            # Faqat xotiraga yoziladi; DB ga write_behind_loop yozadi
+            ACTIVITY.touch(user.id, user.first_name, user.username)
         return await handler(event, data)
 
 # ---------------- CONFIG ----------------
@@ -71,16 +86,44 @@ INITIAL_ADMINS = [7566796449]
 
 # DB_FILE removed, using db.py's internal DB_NAME
 RAMADAN_START_DATE = os.getenv("RAMADAN_START_DATE", "2026-02-19")  # YYYY-MM-DD (19-fevral)
-PRAYER_SOURCE = "islom.uz"                 # primary source
+PRAYER_CALC = os.getenv("PRAYER_CALC", "1") != "0"  # asosiy manba: mahalliy hisob (prayer_calc.py)
+PRAYER_DRIFT_WARN = 3                      # daqiqa, hisob va tarmoq manbasi farqi shundan oshsa ogohlantirish
+ISLOM_URL = "https://islom.uz"             # tarmoq manbalari (hisobni tekshirish uchun)
 NAMOZVAQTI_BASE = "https://namoz-vaqti.uz/"
 ALADHAN_BASE = "http://api.aladhan.com/v1/timingsByCity"
 PRAYER_CACHE_TTL = 7 * 24 * 3600           # 7 kun
-BROADCAST_DELAY = 0.05                     # sekund
+PRAYER_TABLE_TTL = 35 * 24 * 3600          # oylik jadvaldan olingan kunlar uchun
+PRAYER_SOURCE_TTL = {"namoz-vaqti.uz": PRAYER_TABLE_TTL}  # qolganlari PRAYER_CACHE_TTL
+PRAYER_MAX_STALE = 3 * 24 * 3600           # TTL dan keyin shuncha vaqt eski qiymat beriladi (fonda yangilanadi)
+SCREEN_CACHE_MAX = 4096                    # tayyor matnlar (viloyat, sana, ekran)
+SCREEN_CACHE_TTL = 24 * 3600
+PRAYER_WARM_DAYS = 31                      # startupda DB dan yuklanadigan kunlar
+PRAYER_CACHE_MAX = 2048                    # xotiradagi (viloyat, sana) yozuvlari chegarasi
+TASHKENT_SLUGS = ("toshkent", "toshkent-shahri")  # islom.uz faqat Toshkent vaqtini beradi
+PRAYER_REFRESH_BUDGET = 45                 # sekund, barcha viloyatlarni yangilash uchun
+SOURCE_CONCURRENCY = {                     # har bir manbaga bir vaqtda nechta so'rov
+    "islom.uz": 2,
+    "namoz-vaqti.uz": 4,
+    "aladhan": 4,
+}
+PRAYER_HEDGE_PERCENTILE = 0.9              # manba shu percentile kechikishdan oshsa, keyingisi parallel boshlanadi
+PRAYER_HEDGE_DEFAULT_DELAY = 3             # sekund, kechikish statistikasi hali yo'q bo'lsa
+BREAKER_FAILURES = 3                       # ketma-ket xatolar -> manba vaqtincha o'chiriladi
+BREAKER_RESET = 120                        # sekund, keyin bitta sinov so'rovi
+BROADCAST_RATE = 30                        # xabar/sekund (Telegram limiti)
+BROADCAST_MIN_RATE = 1                     # flood-controldan keyingi eng past tezlik
+BROADCAST_WORKERS = 8                      # parallel yuboruvchilar soni
+BROADCAST_BATCH = 200                      # checkpoint oralig'i (userlar)
 CACHE_REFRESH_INTERVAL = 24 * 3600         # 24 soat
-VIDEO_DATA_FILE = "videos.json"
+VIDEO_DATA_FILE = "videos.json"            # eski saqlash joyi, bir marta bazaga import qilinadi
 LONG_THRESHOLD = 120                       # sekund
 DEFAULT_DURATION = 8
+AUTOPLAY_MAX_EDITS = 20                    # avto-ijroda bir vaqtda nechta video tahrirlanadi
+LIST_PAGE_SIZE = 8                         # ro'yxat klaviaturalarida bir sahifadagi elementlar
+SESSION_MAX = 100_000                      # xotiradagi user/chat sessiyalari chegarasi
+SESSION_IDLE_TTL = 12 * 3600               # sekund, shuncha harakatsiz sessiya o'chiriladi
 RAMADAN_CHECK_INTERVAL = 3600              # har soatda tekshiradi
+WRITE_BEHIND_INTERVAL = 30                 # sekund, last_active va duo statistikasi DB ga yoziladi
 
 # ---------------- LOGGING ----------------
 logging.basicConfig(level=logging.INFO)
@@ -92,6 +135,10 @@ dp = Dispatcher(storage=MemoryStorage())
 
 # ---------------- GLOBALS ----------------
 ADMINS = list(INITIAL_ADMINS)  # runtime adminlar ro'yxati
+BROADCAST_PACER = AdaptivePacer(BROADCAST_RATE, BROADCAST_MIN_RATE)  # barcha ommaviy yuborishlar uchun umumiy limit
+BROADCAST_JOBS = {}            # job_id -> asyncio.Task (fonda ishlayotgan broadcastlar)
+ACTIVITY = ActivityTracker()   # user faolligi (write-behind)
+DUO_OPENS = DuoOpenCounter()   # duo ochilishlari (write-behind)
 
 # ---------------- CONSTANTS ----------------
 REGIONS = [
@@ -140,8 +187,32 @@ def format_date_full(date_obj):
     """Format date as '19-fevral' style"""
     return f"{date_obj.day}-{MONTH_NAMES_FULL[date_obj.month]}"
 
-_prayer_cache = {}
-_prayer_cache_time = {}
+# (region_slug, "YYYY-MM-DD") -> (source, times)
+PRAYER_CACHE = TTLCache(PRAYER_CACHE_MAX, PRAYER_CACHE_TTL, stale_ttl=PRAYER_MAX_STALE)
+PRAYER_FLIGHTS = SingleFlight()  # (region_slug, date) -> bitta tarmoq so'rovi
+PRAYER_REVALIDATIONS = {}        # (region_slug, date) -> fonda ishlayotgan yangilash taski
+PRAYER_DRIFT = {}                # region_slug -> oxirgi tekshiruvdagi hisob/tarmoq farqi (daqiqa)
+
+def _source_kwargs(name: str):
+    return {
+        "concurrency": SOURCE_CONCURRENCY[name],
+        "breaker": CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET),
+    }
+
+# Ustuvorlik tartibida: islom.uz -> namoz-vaqti.uz -> AlAdhan
+PRAYER_PIPELINE = SourcePipeline(
+    [
+        IslomSource(ISLOM_URL, TASHKENT_SLUGS, **_source_kwargs("islom.uz")),
+        NamozVaqtiSource(NAMOZVAQTI_BASE, **_source_kwargs("namoz-vaqti.uz")),
+        AladhanSource(ALADHAN_BASE, **_source_kwargs("aladhan")),
+    ],
+    hedge_percentile=PRAYER_HEDGE_PERCENTILE,
+    default_delay=PRAYER_HEDGE_DEFAULT_DELAY,
+)
+
+def _prayer_cache_put(region_slug: str, day: str, times: dict, fetched_at: datetime, source: str):
+    ttl = PRAYER_SOURCE_TTL.get(source, PRAYER_CACHE_TTL)
+    PRAYER_CACHE.put((region_slug, day), (source, times), ttl=ttl, stored_at=fetched_at.timestamp())
 
 # ---------------- FSM STATES ----------------
 class StateDuoAdd(StatesGroup):
@@ -164,17 +235,8 @@ class StateAdminAdd(StatesGroup):
     waiting_id = State()
 
 # ---------------- VIDEO HELPERS ----------------
-if not os.path.exists(VIDEO_DATA_FILE):
-    with open(VIDEO_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump([], f)
-
-def load_videos():
-    with open(VIDEO_DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_videos(videos):
-    with open(VIDEO_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(videos, f, indent=2, ensure_ascii=False)
+VIDEOS = VideoCatalog()  # on_startup da bazadan yuklanadi
+DUOS = DuoCatalog(BUILTIN_DUOS)  # on_startup da bazadan yuklanadi
 
 def classify_kind(duration: Optional[int]) -> str:
     try:
@@ -184,51 +246,38 @@ def classify_kind(duration: Optional[int]) -> str:
         pass
     return "short"
 
-def add_video_fileid(fid: str, duration: Optional[int] = None):
-    vids = load_videos()
+async def add_video_fileid(fid: str, duration: Optional[int] = None):
     dur = duration if duration is not None else DEFAULT_DURATION
     kind = classify_kind(dur)
-    entry = {"file_id": fid, "duration": int(dur), "kind": kind}
-    vids.append(entry)
-    save_videos(vids)
-    return len(vids), kind
-
-def remove_video_by_pos(pos: int):
-    vids = load_videos()
-    if pos < 1 or pos > len(vids):
-        return False, None
-    removed = vids.pop(pos - 1)
-    save_videos(vids)
-    return True, removed
+    return await VIDEOS.add(fid, int(dur), kind), kind
+
+async def remove_video_by_pos(pos: int):
+    removed = await VIDEOS.remove(pos)
+    return removed is not None, removed
 
 def get_filtered(kind: str):
-    return [v for v in load_videos() if v.get("kind") == kind]
+    return VIDEOS.playlist(kind)
 
-# Video state
-AUTO_PLAY = {}       # chat_id -> bool
-AUTO_TASKS = {}      # chat_id -> asyncio.Task
-CURRENT_INDEX = {}   # chat_id -> index
-CURRENT_INFO = {}    # chat_id -> dict
+# Per-user / per-chat runtime state (message queue, debounce, video state)
+SESSIONS = SessionStore(SESSION_MAX, SESSION_IDLE_TTL)
 
 # Message queue system - keeps max 2 messages per user
-USER_MSG_QUEUE = {}  # user_id -> [msg_id1, msg_id2]
 MAX_USER_MESSAGES = 2
 
-# Debounce system - prevents duplicate callback processing
-LAST_CALLBACK = {}   # user_id -> (callback_data, timestamp)
-DEBOUNCE_SECONDS = 1.0  # minimum seconds between same callbacks
+# Callback debounce/throttle (ThrottleMiddleware, handlerlardan oldin)
+CALLBACK_DUPLICATE_WINDOW = 1.0  # bir xil callback data qayta kelsa tashlanadi
+CALLBACK_THROTTLE = (            # (guruh, prefikslar, sekund) - guruhdagi istalgan tugma
+    ("video", ("video:", "watch:"), 0.4),
+    ("calendar", ("region:", "ramday:", "time:"), 0.3),
+)
+THROTTLE = ThrottleMiddleware(SESSIONS, CALLBACK_DUPLICATE_WINDOW, CALLBACK_THROTTLE)
 
 # Start command debounce - prevents duplicate /start processing
-LAST_START = {}  # user_id -> timestamp
 START_DEBOUNCE_SECONDS = 2.0  # minimum seconds between /start commands
 
 async def send_queued_message(chat_id: int, user_id: int, text: str, **kwargs):
     """Send message and manage queue - delete oldest if more than MAX_USER_MESSAGES"""
-    # Initialize queue for user if not exists
-    if user_id not in USER_MSG_QUEUE:
-        USER_MSG_QUEUE[user_id] = []
-    
-    queue = USER_MSG_QUEUE[user_id]
+    queue = SESSIONS.get(user_id).msg_ids
     
     # If queue is full, delete the oldest message
     if len(queue) >= MAX_USER_MESSAGES:
@@ -246,184 +295,161 @@ async def send_queued_message(chat_id: int, user_id: int, text: str, **kwargs):
     
     return sent
 
-def is_duplicate_callback(user_id: int, callback_data: str) -> bool:
-    """Check if this is a duplicate callback (same callback within DEBOUNCE_SECONDS)"""
-    now = datetime.now().timestamp()
-    key = user_id
-    
-    if key in LAST_CALLBACK:
-        last_data, last_time = LAST_CALLBACK[key]
-        if last_data == callback_data and (now - last_time) < DEBOUNCE_SECONDS:
-            return True
-    
-    LAST_CALLBACK[key] = (callback_data, now)
-    return False
-
-# Video navigation debounce - tracks ANY video button press, not just same button
-LAST_VIDEO_NAV = {}  # user_id -> timestamp
-VIDEO_NAV_DEBOUNCE = 0.4  # seconds between ANY video navigation
-
-def is_video_nav_spam(user_id: int) -> bool:
-    """Check if user is spamming video navigation buttons"""
-    now = datetime.now().timestamp()
-    
-    if user_id in LAST_VIDEO_NAV:
-        last_time = LAST_VIDEO_NAV[user_id]
-        if (now - last_time) < VIDEO_NAV_DEBOUNCE:
-            return True
-    
-    LAST_VIDEO_NAV[user_id] = now
-    return False
-
 # Database logic moved to db.py
 
-# ---------------- PRAYER TIMES (islom.uz parser) ----------------  
-LABEL_TO_KEY = {
-    "Тонг": "bomdod",
-    "Қуёш": "quyosh",
-    "Пешин": "peshin",
-    "Аср": "asr",
-    "Шом": "shom",
-    "Хуфтон": "xufton",
-}
-
-async def fetch_prayer_from_islom():
-    url = "https://islom.uz"
+# ---------------- PRAYER TIMES ----------------
+async def _remember_prayer_times(regions, entries: dict, source: str, now: datetime):
+    """Put {YYYY-MM-DD: times} for each region into the memory cache and persist them with one write"""
+    rows = []
+    fetched_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    for region_slug in regions:
+        for day, times in entries.items():
+            _prayer_cache_put(region_slug, day, times, now, source)
+            forget_screens(region_slug, day)
+            rows.append((region_slug, day, source, fetched_at, times))
     try:
-        headers = {"User-Agent": "Mozilla/5.0 (compatible; Bot/1.0)"}
-        async with aiohttp.ClientSession(headers=headers) as s:
-            async with s.get(url, timeout=12) as resp:
-                if resp.status != 200:
-                    log.warning("islom.uz returned status %s", resp.status)
-                    return None
-                text = await resp.text()
+        await save_prayer_times(rows)
     except Exception as e:
-        log.exception("islom.uz fetch failed: %s", e)
-        return None
+        log.exception("prayer_times save failed: %s", e)
 
-    idx = text.find("Намоз вақтлари")
-    if idx == -1:
-        idx = text.find("Namoz vaqtlari")
-    snippet = text[idx: idx + 3500] if idx != -1 else text[:3500]
-    s = re.sub(r"\s+", " ", snippet)
-
-    result = {}
-    for label in ["Тонг", "Қуёш", "Пешин", "Аср", "Шом", "Хуфтон"]:
-        pos = s.find(label)
-        if pos == -1:
-            pos = s.find(label.capitalize())
-        if pos == -1:
+async def warm_prayer_cache():
+    """Load today's and the coming days' rows from SQLite in one query"""
+    today = datetime.now().date()
+    rows = await load_prayer_times(today.isoformat(), (today + timedelta(days=PRAYER_WARM_DAYS)).isoformat())
+    for region, day, source, fetched_at, times in rows:
+        try:
+            fetched = datetime.strptime(fetched_at, "%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
             continue
-        start = max(0, pos - 120)
-        fragment = s[start: pos + len(label) + 40]
-        m = re.search(r"(\d{1,2}:\d{2}(?::\d{2})?)", fragment)
-        if m:
-            time_raw = m.group(1)
-            hh, mm, *_ = time_raw.split(":")
-            hhmm = f"{int(hh):02d}:{int(mm):02d}"
-            key = LABEL_TO_KEY.get(label, label)
-            result[key] = hhmm
-
-    # fallback: pick first 6 times if not all found
-    if len(result) < 6:
-        times = re.findall(r"\b(\d{1,2}:\d{2})(?::\d{2})?\b", s)
-        filtered = [t for t in times if t != "00:00"]
-        uniq = []
-        for t in filtered:
-            if t not in uniq:
-                uniq.append(t)
-            if len(uniq) >= 6:
-                break
-        need = ['bomdod','quyosh','peshin','asr','shom','xufton']
-        if len(uniq) >= 6:
-            for i, k in enumerate(need):
-                result[k] = uniq[i]
-
-    if result.get('bomdod') and result.get('xufton'):
-        return result
-    return None
+        _prayer_cache_put(region, day, times, fetched, source)
+    log.info("Prayer cache DB dan yuklandi: %s yozuv", len(rows))
+
+def _as_date(value):
+    """Calendar day of a date or datetime (handlers pass both)"""
+    return value.date() if isinstance(value, datetime) else value
 
 async def fetch_prayer_namozvaqti(region_slug: str, target_date: datetime = None):
     if target_date is None:
         target_date = datetime.now()
-    key = f"{region_slug}|{target_date.strftime('%Y-%m-%d')}"
-    now = datetime.now()
-
-    # Check fixed Ramadan 2026 times (all regions via ramadan_times.py)
-    date_str = target_date.strftime("%Y-%m-%d")
-    ramadan_times = get_ramadan_times(region_slug, date_str)
+    region_slug = region_slug or "toshkent-shahri"
+    times = _table_prayer_times(region_slug, target_date)
+    if times:
+        return times
+    return await fetch_prayer_network(region_slug, target_date)
+
+def _table_prayer_times(region_slug: str, target_date: datetime):
+    """Fixed Ramadan 2026 times (ramadan_times.py), else the local calculation"""
+    ramadan_times = get_ramadan_times(region_slug, target_date.strftime("%Y-%m-%d"))
     if ramadan_times:
-        _prayer_cache[key] = ramadan_times
-        _prayer_cache_time[key] = now
         return ramadan_times
+    if PRAYER_CALC:
+        return calculated_times(region_slug, _as_date(target_date))
+    return None
 
-    if key in _prayer_cache and (now - _prayer_cache_time.get(key, now)).total_seconds() < PRAYER_CACHE_TTL:
-        return _prayer_cache[key]
+def local_prayer_times(region_slug: str, target_date: datetime):
+    """Times available without network I/O: table, calculation or a fresh cache entry"""
+    times = _table_prayer_times(region_slug, target_date)
+    if times:
+        return times
+    cached = PRAYER_CACHE.get((region_slug, target_date.strftime("%Y-%m-%d")))
+    return cached[1] if cached else None
+
+async def fetch_prayer_network(region_slug: str, target_date: datetime, allow_stale: bool = True):
+    """
+    Cached network times for a region/date. An entry past its TTL but within
+    PRAYER_MAX_STALE is returned at once and refreshed in the background;
+    with `allow_stale=False` (or beyond that window) the caller waits.
+    """
+    date_str = target_date.strftime("%Y-%m-%d")
+    cached = PRAYER_CACHE.get_stale((region_slug, date_str))
+    if cached:
+        (_, times), stale = cached
+        if not stale:
+            return times
+        if allow_stale:
+            _revalidate_prayer(region_slug, target_date)
+            return times
+
+    # Bir vaqtda kelgan bir xil so'rovlar bitta tarmoq zanjirini kutadi
+    return await PRAYER_FLIGHTS.do(
+        (region_slug, date_str), lambda: _fetch_prayer_remote(region_slug, target_date)
+    )
 
-    # try primary source: islom.uz (for Tashkent)
-    try:
-        if PRAYER_SOURCE == "islom.uz" or region_slug in (None, "", "toshkent", "toshkent-shahri"):
-            parsed = await fetch_prayer_from_islom()
-            if parsed:
-                _prayer_cache[key] = parsed
-                _prayer_cache_time[key] = now
-                return parsed
-    except Exception:
-        log.exception("islom.uz parsing failed")
+def _revalidate_prayer(region_slug: str, target_date: datetime):
+    """Start a background refresh for a stale entry unless one is already running"""
+    key = (region_slug, target_date.strftime("%Y-%m-%d"))
+    if key in PRAYER_FLIGHTS or key in PRAYER_REVALIDATIONS:
+        return
+    task = asyncio.create_task(
+        PRAYER_FLIGHTS.do(key, lambda: _fetch_prayer_remote(region_slug, target_date))
+    )
+    PRAYER_REVALIDATIONS[key] = task
+    task.add_done_callback(lambda t: _revalidation_done(key, t))
 
-    # fallback: namoz-vaqti.uz
-    try:
-        month_period = target_date.strftime("%Y-%m")
-        params = {"format": "json", "region": region_slug, "period": month_period}
-        async with aiohttp.ClientSession() as s:
-            async with s.get(NAMOZVAQTI_BASE, params=params, timeout=12) as resp:
-                if resp.status == 200:
-                    j = await resp.json()
-                    table = j.get("period_table") or []
-                    target_str = target_date.strftime("%d.%m.%Y")
-                    for entry in table:
-                        if entry.get("date") == target_str:
-                            times = entry.get("times")
-                            _prayer_cache[key] = times
-                            _prayer_cache_time[key] = now
-                            return times
-                    today = j.get("today")
-                    if today and "times" in today:
-                        times = today["times"]
-                        _prayer_cache[key] = times
-                        _prayer_cache_time[key] = now
-                        return times
-    except Exception as e:
-        log.exception("namoz-vaqti.uz failed: %s", e)
-
-    # fallback: AlAdhan  
-        params2 = {
-            "city": region_slug or "Tashkent",
-            "country": "Uzbekistan",
-            "method": 2,
-            "date": target_date.strftime("%d-%m-%Y")
-        }
-        async with aiohttp.ClientSession() as s:
-            async with s.get(ALADHAN_BASE, params=params2, timeout=12) as resp:
-                if resp.status == 200:
-                    j = await resp.json()
-                    timings = j.get("data", {}).get("timings")
-                    if timings:
-                        _prayer_cache[key] = timings
-                        _prayer_cache_time[key] = now
-                        return timings
-    except Exception as e:
-        log.exception("aladhan failed: %s", e)
-    return None
+def _revalidation_done(key, task: asyncio.Task):
+    PRAYER_REVALIDATIONS.pop(key, None)
+    if not task.cancelled() and task.exception():
+        log.warning("Prayer revalidation failed: %s", task.exception())
 
-async def refresh_prayer_cache_for_all():
+async def _fetch_prayer_remote(region_slug: str, target_date: datetime):
+    """Run the source pipeline for one region/date and remember what it returns"""
+    now = datetime.now()
+    result = await PRAYER_PIPELINE.fetch(region_slug, _as_date(target_date))
+    if not result:
+        return None
+    source, regions, entries = result
+    # namoz-vaqti.uz butun oyni, islom.uz ikkala Toshkent slugini to'ldiradi
+    await _remember_prayer_times(regions, entries, source, now)
+    return entries.get(target_date.strftime("%Y-%m-%d"))
+
+async def refresh_prayer_cache_for_all(budget: float = PRAYER_REFRESH_BUDGET):
+    """
+    Refresh every region's network times concurrently within `budget`
+    seconds and compare them with the local calculation.
+    """
     log.info("Prayer cache yangilanmoqda")
-    for _, slug in REGIONS:
-        await fetch_prayer_namozvaqti(slug, datetime.now())
-    log.info("Prayer cache yangilandi")
+    started = time.monotonic()
+    target = datetime.now()
+
+    async def refresh_region(slug: str):
+        t0 = time.monotonic()
+        remaining = budget - (t0 - started)
+        try:
+            times = await asyncio.wait_for(
+                fetch_prayer_network(slug, target, allow_stale=False), timeout=remaining
+            )
+            status = "ok" if times else "yo'q"
+            calc = calculated_times(slug, target.date())
+            drift = max_drift(calc, times) if calc and times else None
+            if drift is not None:
+                PRAYER_DRIFT[slug] = drift
+                if drift > PRAYER_DRIFT_WARN:
+                    log.warning("Prayer calc drift %s: %s daqiqa (hisob %s, tarmoq %s)", slug, drift, calc, times)
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            log.exception("Prayer refresh failed for %s: %s", slug, e)
+            status = "xato"
+        return slug, status, time.monotonic() - t0
+
+    results = await asyncio.gather(*(refresh_region(slug) for _, slug in REGIONS))
+    ok = sum(1 for _, status, _ in results if status == "ok")
+    details = ", ".join(f"{slug} {dt:.1f}s" + ("" if status == "ok" else f" ({status})") for slug, status, dt in results)
+    log.info("Prayer cache yangilandi: %s/%s viloyat, %.1fs [%s]", ok, len(results), time.monotonic() - started, details)
+    asyncio.create_task(prerender_screens())
+    return results
 
 # ---------------- KEYBOARDS ----------------
+# Klaviaturalar bir marta quriladi va umumiy ishlatiladi (o'zgartirmang);
+# Toshkent sanasi almashganda hammasi tozalanadi - 🌟 bugungi kun belgisi siljiydi
+KEYBOARDS = DailyMemo(lambda: now_tashkent_date())
+# Duolar menyusi sanaga emas, katalog versiyasiga bog'liq: (version, is_admin) -> klaviatura
+DUO_MENUS = {}
+
 def build_main_inline():
+    return KEYBOARDS.get("main", _build_main_inline)
+
+def _build_main_inline():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📅 Ramazon taqvimi", callback_data="menu:ramadan")],
         [InlineKeyboardButton(text="🕌 Namoz vaqtlari", callback_data="menu:prayer")],
@@ -443,13 +469,142 @@ def build_admin_reply_kb():
         resize_keyboard=True
     )
 
+def duo_menu_kb(is_admin: bool, page: int = 0):
+    """One page of the duo menu, built once per (catalog version, is_admin, page)"""
+    pages = max(1, -(-len(DUOS.items()) // LIST_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    key = (DUOS.version, is_admin, page)
+    kb = DUO_MENUS.get(key)
+    if kb is None:
+        if any(k[0] != DUOS.version for k in DUO_MENUS):
+            DUO_MENUS.clear()
+        kb = DUO_MENUS[key] = _build_duo_menu_kb(is_admin, page, pages)
+    return kb
+
+def _build_duo_menu_kb(is_admin: bool, page: int, pages: int):
+    rows = []
+    if is_admin:
+        rows.append([InlineKeyboardButton(text="➕ Duo qo'shish", callback_data="duos:add"),
+                     InlineKeyboardButton(text="🗑 Duo o'chirish (admin)", callback_data="duos:admin_delete")])
+    start = page * LIST_PAGE_SIZE
+    for key, title, _ in DUOS.items()[start:start + LIST_PAGE_SIZE]:
+        label = title if len(title) <= 30 else title[:27] + "..."
+        rows.append([InlineKeyboardButton(text=label, callback_data=f"duo_open:{key}")])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"duos:page:{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"duos:page:{page + 1}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🔙 Orqaga", callback_data="duos:back")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# Admin tanlash ro'yxatlari bazadan keyset sahifalar bilan olinadi: tugmalarda
+# qo'shni sahifaning chegaraviy kaliti ("<prefix>:next:<key>" / "<prefix>:prev:<key>")
+def page_nav_row(prefix: str, first, last, has_prev: bool, has_next: bool):
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"{prefix}:prev:{first}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"{prefix}:next:{last}"))
+    return nav
+
+def page_cursor(payload: str):
+    """(after, before) for a "next:<key>"/"prev:<key>" payload, or None"""
+    direction, _, key = payload.partition(":")
+    if direction not in ("next", "prev") or not key.isdigit():
+        return None
+    return (int(key), None) if direction == "next" else (None, int(key))
+
+def _paged_kb(prefix: str, buttons, keys, has_prev: bool, has_next: bool, cancel_text: str):
+    rows = [[button] for button in buttons]
+    nav = page_nav_row(prefix, keys[0], keys[-1], has_prev, has_next)
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text=cancel_text, callback_data=f"{prefix}:cancel")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def duo_delete_kb(after=None, before=None):
+    duos, has_prev, has_next = await page_duos(after, before, LIST_PAGE_SIZE)
+    if not duos:
+        return None
+    buttons = [InlineKeyboardButton(text=title[:30], callback_data=f"duo_del:{id_}") for id_, title in duos]
+    return _paged_kb("duo_del", buttons, [id_ for id_, _ in duos], has_prev, has_next, "🔙 Bekor")
+
+async def video_delete_kb(after=None, before=None):
+    vids, has_prev, has_next = await page_videos(after, before, LIST_PAGE_SIZE)
+    if not vids:
+        return None
+    buttons = [InlineKeyboardButton(text=f"{v['position']}. {v['kind']} ({v.get('duration') or '?'}s)",
+                                    callback_data=f"delvid:{v['position']}") for v in vids]
+    return _paged_kb("delvid", buttons, [v["position"] for v in vids], has_prev, has_next, "❌ Bekor")
+
+async def admin_delete_kb(after=None, before=None):
+    admins, has_prev, has_next = await page_admins(after, before, LIST_PAGE_SIZE)
+    if not admins:
+        return None
+    buttons = [InlineKeyboardButton(text=str(a), callback_data=f"admin_del:{a}") for a in admins]
+    return _paged_kb("admin_del", buttons, admins, has_prev, has_next, "❌ Bekor")
+
+async def turn_page(c: CallbackQuery, kb):
+    """Swap the list message's keyboard for another page (None removes it)"""
+    try:
+        await c.message.edit_reply_markup(reply_markup=kb)
+    except Exception:
+        pass  # "message is not modified" va h.k.
+
 def video_kind_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📹 Qisqa videolar", callback_data="watch:short")],
         [InlineKeyboardButton(text="📼 Uzun videolar", callback_data="watch:long")],
     ])
 
+def region_list_kb():
+    return KEYBOARDS.get("regions", _build_region_list_kb)
+
+def _build_region_list_kb():
+    rows = []
+    for i in range(0, len(REGIONS), 2):
+        row = [InlineKeyboardButton(text=REGIONS[i][0], callback_data=f"region:{i}")]
+        if i + 1 < len(REGIONS):
+            row.append(InlineKeyboardButton(text=REGIONS[i + 1][0], callback_data=f"region:{i+1}"))
+        rows.append(row)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def ramadan_calendar_kb(region_idx: int):
+    return KEYBOARDS.get(("calendar", region_idx), lambda: _build_ramadan_calendar_kb(region_idx))
+
+def _build_ramadan_calendar_kb(region_idx: int):
+    today_date = now_tashkent_date()
+    ramadan_start = datetime.fromisoformat(RAMADAN_START_DATE).date()
+    rows = []
+    row = []
+    for d in range(1, 31):
+        # Haqiqiy sanani hisoblash
+        current_date = ramadan_start + timedelta(days=d - 1)
+        date_label = format_date_short(current_date)  # "19-fev" formatida
+        
+        # Bugungi kun bo'lsa yulduz qo'shish
+        if current_date == today_date:
+            label = f"🌟 {date_label}"
+        else:
+            label = date_label
+        
+        row.append(InlineKeyboardButton(text=label, callback_data=f"ramday:{region_idx}:{d}"))
+        if len(row) == 5:
+            rows.append(row)
+            row = []
+    if row:
+        rows.append(row)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 def video_nav_kb(prev=None, next=None, autoplay=False, kind="short"):
+    return KEYBOARDS.get(
+        ("video_nav", prev, next, autoplay, kind), lambda: _build_video_nav_kb(prev, next, autoplay, kind)
+    )
+
+def _build_video_nav_kb(prev, next, autoplay, kind):
     rows = []
     nav = []
     if prev is not None:
@@ -464,13 +619,15 @@ def video_nav_kb(prev=None, next=None, autoplay=False, kind="short"):
 # ---------------- VIDEO SEND / EDIT ----------------
 async def send_and_track(chat_id: int, file_id: str, prev_idx: Optional[int], next_idx: Optional[int], autoplay: bool, kind: str):
     sent = await bot.send_video(chat_id, video=file_id, reply_markup=video_nav_kb(prev_idx, next_idx, autoplay, kind))
-    CURRENT_INFO[chat_id] = {"chat_id": chat_id, "message_id": sent.message_id, "kind": kind}
+    session = SESSIONS.get(chat_id)
+    session.video_message_id = sent.message_id
+    session.video_kind = kind
     return sent
 
 async def edit_tracked(chat_id: int, file_id: str, prev_idx: Optional[int], next_idx: Optional[int], autoplay: bool, kind: str = "short"):
-    info = CURRENT_INFO.get(chat_id)
+    session = SESSIONS.peek(chat_id)
     kb = video_nav_kb(prev_idx, next_idx, autoplay, kind)
-    if not info:
+    if not session or session.video_message_id is None:
         try:
             # If state is lost, we try to rebuild it
             await send_and_track(chat_id, file_id, prev_idx, next_idx, autoplay, kind)
@@ -478,11 +635,11 @@ async def edit_tracked(chat_id: int, file_id: str, prev_idx: Optional[int], next
         except:
             return False
     # Update state just in case
-    info["kind"] = kind
+    session.video_kind = kind
     try:
         await bot.edit_message_media(
-            chat_id=info["chat_id"],
-            message_id=info["message_id"],
+            chat_id=chat_id,
+            message_id=session.video_message_id,
             media=InputMediaVideo(media=file_id),
             reply_markup=kb
         )
@@ -494,29 +651,129 @@ async def edit_tracked(chat_id: int, file_id: str, prev_idx: Optional[int], next
         except:
             return False
 
-async def autoplay_worker(chat_id: int, start_idx: int):
-    idx = start_idx
-    while AUTO_PLAY.get(chat_id, False):
-        info = CURRENT_INFO.get(chat_id)
-        if not info:
-            break
-        kind = info.get("kind", "short")
-        playlist = get_filtered(kind)
-        if idx >= len(playlist):
-            AUTO_PLAY[chat_id] = False
-            break
-        dur = playlist[idx].get("duration") or DEFAULT_DURATION
-        await asyncio.sleep(max(1, int(dur) + 1))
-        idx += 1
-        if idx >= len(playlist):
-            AUTO_PLAY[chat_id] = False
-            break
-        prev = idx - 1 if idx > 0 else None
-        nxt = idx + 1 if idx + 1 < len(playlist) else None
-        ok = await edit_tracked(chat_id, playlist[idx]["file_id"], prev, nxt, True, kind)
-        if not ok:
-            break
-        CURRENT_INDEX[chat_id] = idx
+def autoplay_delay(video: dict) -> int:
+    """Seconds to keep a video on screen before autoplay moves on"""
+    return max(1, int(video.get("duration") or DEFAULT_DURATION) + 1)
+
+async def autoplay_advance(chat_id: int) -> Optional[int]:
+    """Show the next video of the chat's playlist; delay until the one after, or None to stop"""
+    # Tomosha qilinayotgan chat sessiyasi idle-TTL bo'yicha chiqarilmasin
+    session = SESSIONS.peek(chat_id, touch=True)
+    if not session or session.video_message_id is None or not session.autoplay:
+        return None
+    kind = session.video_kind
+    playlist = get_filtered(kind)
+    idx = session.video_index + 1
+    if idx >= len(playlist):
+        session.autoplay = False
+        return None
+    prev = idx - 1 if idx > 0 else None
+    nxt = idx + 1 if idx + 1 < len(playlist) else None
+    ok = await edit_tracked(chat_id, playlist[idx]["file_id"], prev, nxt, True, kind)
+    if not ok:
+        session.autoplay = False
+        return None
+    session.video_index = idx
+    return autoplay_delay(playlist[idx])
+
+AUTOPLAY = AutoplayScheduler(autoplay_advance, max_concurrent=AUTOPLAY_MAX_EDITS)
+
+# ---------------- BROADCAST JOBS ----------------
+MENU_GREETING = "🌙 Yangi kun muborak! Bugungi menyu:"
+
+def build_job_sender(job: dict):
+    """Rebuild the per-user send coroutine from a stored job"""
+    payload = job["payload"]
+    kind = job["kind"]
+    if kind == "ad":
+        return make_ad_sender(payload["kind"], payload["content"], payload.get("caption", ""))
+    if kind == "ramadan":
+        async def send(uid: int):
+            await bot.send_message(uid, payload["text"], parse_mode="Markdown")
+        return send
+    if kind == "daily_menu":
+        kb = build_main_inline()
+        async def send(uid: int):
+            await bot.send_message(uid, payload["text"], reply_markup=kb)
+        return send
+    raise ValueError(f"Unknown broadcast job kind: {kind}")
+
+def make_ad_sender(kind: str, content: str, caption: str = ""):
+    """Build a per-user send coroutine for an ad of the given kind"""
+    async def send(uid: int):
+        if kind == "text":
+            await bot.send_message(uid, content, parse_mode="HTML")
+        elif kind == "photo":
+            if caption:
+                await bot.send_photo(uid, photo=content, caption=caption, parse_mode="HTML")
+            else:
+                await bot.send_photo(uid, photo=content, parse_mode="HTML")
+        elif kind == "video":
+            if caption:
+                await bot.send_video(uid, video=content, caption=caption, parse_mode="HTML")
+            else:
+                await bot.send_video(uid, video=content, parse_mode="HTML")
+    return send
+
+async def run_broadcast_job(job_id: int):
+    """Deliver (or resume) a stored job and report the result"""
+    job = await get_broadcast_job(job_id)
+    if not job:
+        return
+    ad_id = job["ad_id"]
+
+    async def report(sent: int, failed: int):
+        if ad_id:
+            await update_ad_sent_count(ad_id, sent, f"sent:{sent},failed:{failed}")
+
+    try:
+        sent, failed = await run_job(
+            job_id, build_job_sender(job), BROADCAST_PACER,
+            workers=BROADCAST_WORKERS, batch_size=BROADCAST_BATCH, on_progress=report
+        )
+    except Exception as e:
+        log.exception("Broadcast job %s failed: %s", job_id, e)
+        return
+    await report(sent, failed)
+    log.info(f"Broadcast tugadi ({job['job_key']}). Sent: {sent}, Failed: {failed}")
+
+    if job["kind"] == "ad" and job["admin_chat_id"]:
+        notify = [job["admin_chat_id"]]
+        text = f"Reklama yuborildi: {sent} ta, xato: {failed} ta"
+    elif job["kind"] == "ramadan":
+        notify = list(ADMINS)
+        text = f"Ramazon e'lon qilindi. Xabar yuborildi: {sent}, xato: {failed}"
+    else:
+        notify = []
+    for chat_id in notify:
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception:
+            pass
+
+def start_broadcast_job(job_id: int):
+    """Start a job in the background unless it is already running"""
+    task = BROADCAST_JOBS.get(job_id)
+    if task and not task.done():
+        return task
+    task = asyncio.create_task(run_broadcast_job(job_id))
+    BROADCAST_JOBS[job_id] = task
+    task.add_done_callback(lambda _t: BROADCAST_JOBS.pop(job_id, None))
+    return task
+
+async def resume_broadcast_jobs():
+    """Pick up jobs interrupted by a restart"""
+    today_key = f"daily_menu:{now_tashkent_date().isoformat()}"
+    for job in await get_unfinished_broadcast_jobs():
+        # Kechagi "yangi kun" menyusini qayta yuborish ma'nosiz
+        if job["kind"] == "daily_menu" and job["job_key"] != today_key:
+            await set_broadcast_job_status(job["id"], "expired")
+            continue
+        log.info("Broadcast job %s (%s) davom ettirilmoqda", job["id"], job["job_key"])
+        start_broadcast_job(job["id"])
+    pruned = await prune_broadcast_deliveries()
+    if pruned:
+        log.info("Tugagan broadcastlarning %s ta ledger qatori o'chirildi", pruned)
 
 # ---------------- RAMADAN ANNOUNCE ----------------
 def now_tashkent_date():
@@ -529,8 +786,14 @@ async def announce_ramadan_if_needed():
         ramadan_start = datetime.fromisoformat(RAMADAN_START_DATE).date()
         if today < ramadan_start:
             return False
-        announced = await get_meta("ramadan_announced")
-        if announced == "1":
+        job_key = f"ramadan:{RAMADAN_START_DATE}"
+        job = await get_broadcast_job_by_key(job_key)
+        if job:
+            if job["status"] != "done":
+                start_broadcast_job(job["id"])
+            return False
+        # Eski versiya e'lonni meta belgisi bilan saqlagan
+        if await get_meta("ramadan_announced") == "1":
             return False
         msg = (
             "🌙 *Ramazon boshlandi!* \n\n"
@@ -538,25 +801,10 @@ async def announce_ramadan_if_needed():
             "Saharlik va iftorlik vaqtlarini tekshiring va duo qiling. \n\n"
             "📌 Taqvim / Namoz vaqtlari uchun bot menyusiga qarang."
         )
-        users = await get_all_users()
-        sent = failed = 0
-        for u in users:
-            uid = u[0]
-            try:
-                await bot.send_message(uid, msg, parse_mode="Markdown")
-                sent += 1
-                await asyncio.sleep(0.02)
-            except Exception:
-                failed += 1
-        ad_id = await add_ad("ramadan_notice", msg, f"sent:{sent},failed:{failed}", "")
-        await update_ad_sent_count(ad_id, sent, f"failed:{failed}")
-        await set_meta("ramadan_announced", "1")
-        for adm in ADMINS:
-            try:
-                await bot.send_message(adm, f"Ramazon e'lon qilindi. Xabar yuborildi: {sent}, xato: {failed}")
-            except:
-                pass
-        log.info("Ramadan announcement sent: %s sent, %s failed", sent, failed)
+        ad_id = await add_ad("ramadan_notice", msg, "", "")
+        job_id = await create_broadcast_job(job_key, "ramadan", {"text": msg}, ad_id=ad_id)
+        start_broadcast_job(job_id)
+        log.info("Ramadan announcement started (job %s)", job_id)
         return True
     except Exception as e:
         log.exception("announce_ramadan_if_needed failed: %s", e)
@@ -592,37 +840,121 @@ async def daily_namaz_updater_loop():
             await refresh_prayer_cache_for_all()
             log.info("Daily namaz times refreshed at Tashkent midnight.")
             
-            # Broadcast menu to all users
-            user_ids = await get_all_user_ids()
-            kb = build_main_inline()
-            sent_count = 0
-            for uid in user_ids:
-                try:
-                    await bot.send_message(uid, "🌙 Yangi kun muborak! Bugungi menyu:", reply_markup=kb)
-                    sent_count += 1
-                    await asyncio.sleep(0.05)
-                except:
-                    pass
-            log.info("Daily menu broadcast to %s users", sent_count)
+            # Broadcast menu to all users (resumable job, one per Tashkent day)
+            job_key = f"daily_menu:{now_tashkent_date().isoformat()}"
+            job_id = await create_broadcast_job(job_key, "daily_menu", {"text": MENU_GREETING})
+            start_broadcast_job(job_id)
+            log.info("Daily menu broadcast started (job %s)", job_id)
             
         except Exception as e:
             log.exception("daily_namaz_updater_loop error: %s", e)
         # Sleep for 10 minutes to prevent re-triggering approx midnight
         await asyncio.sleep(600)
 
+# ---------------- RENDERED SCREENS ----------------
+# Matn faqat (viloyat, sana) ga bog'liq: bir marta tayyorlanadi, tap = bitta lookup
+SCREEN_NAMES = ("prayer", "ramday", "sahar", "iftor")
+SCREENS = TTLCache(SCREEN_CACHE_MAX, SCREEN_CACHE_TTL)  # (slug, YYYY-MM-DD, screen) -> text / (text, kb)
+
+def _time_of(times: dict, *keys: str) -> str:
+    for k in keys:
+        if times.get(k):
+            return times[k][:5]
+    return "—:--"
+
+def render_prayer_screen(times: Optional[dict], date: datetime):
+    if not times:
+        return None
+    order = ['bomdod', 'quyosh', 'peshin', 'asr', 'shom', 'xufton']
+    labels = {'bomdod':'Bomdod','quyosh':'Quyosh','peshin':'Peshin','asr':'Asr','shom':'Shom','xufton':'Xufton'}
+    lines = []
+    for k in order:
+        v = _time_of(times, k, k.capitalize(), k.upper())
+        lines.append(f"{labels.get(k, k)}: {v}")
+    return "🕌 Namoz vaqtlari (bugun):\n\n" + "\n".join(lines)
+
+def render_ramday_screen(times: Optional[dict], date: datetime, idx: int, day: int):
+    display, _ = REGIONS[idx]
+    fajr = _time_of(times, 'bomdod', 'Fajr') if times else '—:--'
+    shom = _time_of(times, 'shom', 'Maghrib') if times else '—:--'
+    iso = date.strftime('%Y-%m-%d')
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=f"⏰ Saharlik — {fajr}", callback_data=f"time:{idx}:{day}:sahar:{iso}"),
+                                                InlineKeyboardButton(text=f"🌇 Iftorlik — {shom}", callback_data=f"time:{idx}:{day}:iftor:{iso}")]])
+    text = f"📍 {display}\n🌙 Ramazon {day}-kun ({format_date_full(date)})\n\n⏰ Saharlik: {fajr}\n🌇 Iftorlik: {shom}\n\n(vaqtlar + 2-3 daqiqa farq qilishi mumkin)\n\nDuo ko'rish uchun tanlang:"
+    return text, kb
+
+def render_time_screen(times: Optional[dict], date: datetime, screen: str):
+    if not times:
+        return None
+    if screen == 'sahar':
+        key = 'Saharlik duosi'
+        time_val = _time_of(times, 'bomdod', 'Fajr')
+    else:
+        key = 'Iftorlik duosi'
+        time_val = _time_of(times, 'shom', 'Maghrib')
+    duo = BUILTIN_DUOS.get(key, 'Duo topilmadi.')
+    meaning = BUILTIN_DUO_MEANING.get(key, '')
+    return f"🤲 {key} — {time_val}\n\n{duo}\n\n{meaning}"
+
+async def get_screen(slug: str, date: datetime, screen: str, render, *args):
+    """Rendered screen for (slug, date); rendered and cached on a miss"""
+    key = (slug, date.strftime("%Y-%m-%d"), screen)
+    value = SCREENS.get(key)
+    if value is not None:
+        return value
+    times = await fetch_prayer_namozvaqti(slug, date)
+    value = render(times, date, *args)
+    if times:
+        # Vaqtlar yo'q bo'lsa keshlanmaydi - keyingi tapda yana urinib ko'riladi
+        SCREENS.put(key, value)
+    return value
+
+def forget_screens(region_slug: str, day: str):
+    for screen in SCREEN_NAMES:
+        SCREENS.pop((region_slug, day, screen))
+
+def prerender_screen(slug: str, date: datetime, screen: str, render, *args) -> bool:
+    """Render a screen from local times only; False if it would need the network"""
+    key = (slug, date.strftime("%Y-%m-%d"), screen)
+    if SCREENS.get(key) is not None:
+        return True
+    times = local_prayer_times(slug, date)
+    if not times:
+        return False  # birinchi tapda get_screen tarmoqdan oladi
+    SCREENS.put(key, render(times, date, *args))
+    return True
+
+async def prerender_screens():
+    """
+    Fill today's prayer screen and the Ramadan calendar screens for every
+    region. Never touches the network; screens without local times are
+    left to the first tap.
+    """
+    today = datetime.now()
+    start = datetime.fromisoformat(RAMADAN_START_DATE)
+    skipped = 0
+    for idx, (_, slug) in enumerate(REGIONS):
+        skipped += not prerender_screen(slug, today, "prayer", render_prayer_screen)
+        for day in range(1, 31):
+            date = start + timedelta(days=day - 1)
+            skipped += not prerender_screen(slug, date, "ramday", render_ramday_screen, idx, day)
+            for screen in ("sahar", "iftor"):
+                skipped += not prerender_screen(slug, date, screen, render_time_screen, screen)
+        await asyncio.sleep(0)  # viloyatlar orasida event loopga navbat beramiz
+    log.info("Ekranlar tayyorlandi: %s (tarmoq kerakligi uchun o'tkazildi: %s)", len(SCREENS), skipped)
+
 # ---------------- HANDLERS ----------------
 @dp.message(CommandStart())
 async def cmd_start(message: Message):
     # Debounce check to prevent duplicate /start processing
     user_id = message.from_user.id
-    now = datetime.now().timestamp()
+    now = time.monotonic()
+    session = SESSIONS.get(user_id)
     
-    if user_id in LAST_START:
-        last_time = LAST_START[user_id]
-        if (now - last_time) < START_DEBOUNCE_SECONDS:
-            return  # Ignore duplicate /start within debounce period
+    if (now - session.last_start_at) < START_DEBOUNCE_SECONDS:
+        return  # Ignore duplicate /start within debounce period
     
-    LAST_START[user_id] = now
+    session.last_start_at = now
     
     first = message.from_user.first_name or "Do'st"
     username = message.from_user.username
@@ -639,22 +971,11 @@ async def cmd_start(message: Message):
 @dp.callback_query(lambda c: c.data == "menu:ramadan")
 async def cb_ramadan(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
-    rows = []
-    for i in range(0, len(REGIONS), 2):
-        row = [InlineKeyboardButton(text=REGIONS[i][0], callback_data=f"region:{i}")]
-        if i + 1 < len(REGIONS):
-            row.append(InlineKeyboardButton(text=REGIONS[i + 1][0], callback_data=f"region:{i+1}"))
-        rows.append(row)
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
-    await send_queued_message(c.message.chat.id, c.from_user.id, "📍 Viloyatingizni tanlang:", reply_markup=kb)
+    await send_queued_message(c.message.chat.id, c.from_user.id, "📍 Viloyatingizni tanlang:", reply_markup=region_list_kb())
 
 @dp.callback_query(F.data.startswith("region:"))
 async def cb_region(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     try:
         idx = int(c.data.split(":", 1)[1])
     except:
@@ -665,35 +986,12 @@ async def cb_region(c: CallbackQuery):
     display, slug = REGIONS[idx]
     await set_user_region(c.from_user.id, slug)
 
-    today_date = (datetime.utcnow() + timedelta(hours=5)).date()  # Toshkent vaqti
-    ramadan_start = datetime.fromisoformat(RAMADAN_START_DATE).date()
-    rows = []
-    row = []
-    for d in range(1, 31):
-        # Haqiqiy sanani hisoblash
-        current_date = ramadan_start + timedelta(days=d - 1)
-        date_label = format_date_short(current_date)  # "19-fev" formatida
-        
-        # Bugungi kun bo'lsa yulduz qo'shish
-        if current_date == today_date:
-            label = f"🌟 {date_label}"
-        else:
-            label = date_label
-        
-        row.append(InlineKeyboardButton(text=label, callback_data=f"ramday:{idx}:{d}"))
-        if len(row) == 5:
-            rows.append(row)
-            row = []
-    if row:
-        rows.append(row)
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
+    kb = ramadan_calendar_kb(idx)
     await send_queued_message(c.message.chat.id, c.from_user.id, f"📍 {display}\n🌙 Ramazon taqvimi (19-fevral — 20-mart)\nKunni tanlang:", reply_markup=kb)
 
 @dp.callback_query(F.data.startswith("ramday:"))
 async def cb_ramday(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     try:
         _, idx_s, day_s = c.data.split(":")
         idx = int(idx_s)
@@ -701,23 +999,13 @@ async def cb_ramday(c: CallbackQuery):
     except:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato ma'lumot.")
     display, slug = REGIONS[idx]
-    start = datetime.fromisoformat(RAMADAN_START_DATE).date()
-    date = start + timedelta(days=day - 1)
-    date_str = format_date_full(date)  # "19-fevral" formatida
-    times = await fetch_prayer_namozvaqti(slug, date)
-    fajr = times.get('bomdod') or times.get('Fajr') or '—:--' if times else '—:--'
-    shom = times.get('shom') or times.get('Maghrib') or '—:--' if times else '—:--'
-    fajr = fajr[:5]
-    shom = shom[:5]
-    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=f"⏰ Saharlik — {fajr}", callback_data=f"time:{idx}:{day}:sahar:{date.strftime('%Y-%m-%d')}"),
-                                                InlineKeyboardButton(text=f"🌇 Iftorlik — {shom}", callback_data=f"time:{idx}:{day}:iftor:{date.strftime('%Y-%m-%d')}")]])
-    await send_queued_message(c.message.chat.id, c.from_user.id, f"📍 {display}\n🌙 Ramazon {day}-kun ({date_str})\n\n⏰ Saharlik: {fajr}\n🌇 Iftorlik: {shom}\n\n(vaqtlar + 2-3 daqiqa farq qilishi mumkin)\n\nDuo ko'rish uchun tanlang:", reply_markup=kb)
+    start = datetime.fromisoformat(RAMADAN_START_DATE)
+    text, kb = await get_screen(slug, start + timedelta(days=day - 1), "ramday", render_ramday_screen, idx, day)
+    await send_queued_message(c.message.chat.id, c.from_user.id, text, reply_markup=kb)
 
 @dp.callback_query(F.data.startswith("time:"))
 async def cb_time(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     try:
         _, idx_s, day_s, ttype, date_str = c.data.split(":")
         idx = int(idx_s)
@@ -726,66 +1014,42 @@ async def cb_time(c: CallbackQuery):
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato.")
     display, slug = REGIONS[idx]
     date = datetime.fromisoformat(date_str)
-    times = await fetch_prayer_namozvaqti(slug, date)
-    if not times:
+    screen = "sahar" if ttype == "sahar" else "iftor"
+    text = await get_screen(slug, date, screen, render_time_screen, screen)
+    if not text:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Namoz vaqtlari topilmadi.")
-    if ttype == 'sahar':
-        key = 'Saharlik duosi'
-        time_val = (times.get('bomdod') or times.get('Fajr') or '—:--')[:5]
-    else:
-        key = 'Iftorlik duosi'
-        time_val = (times.get('shom') or times.get('Maghrib') or '—:--')[:5]
-    duo = BUILTIN_DUOS.get(key, 'Duo topilmadi.')
-    meaning = BUILTIN_DUO_MEANING.get(key, '')
-    await send_queued_message(c.message.chat.id, c.from_user.id, f"🤲 {key} — {time_val}\n\n{duo}\n\n{meaning}")
+    await send_queued_message(c.message.chat.id, c.from_user.id, text)
 
 @dp.callback_query(lambda c: c.data == "menu:prayer")
 async def cb_prayer(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     u = await get_user(c.from_user.id)
     slug = u[3] if u and u[3] else 'toshkent-shahri'
-    times = await fetch_prayer_namozvaqti(slug)
-    if not times:
+    text = await get_screen(slug, datetime.now(), "prayer", render_prayer_screen)
+    if not text:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Namoz vaqtlari topilmadi.")
-    order = ['bomdod', 'quyosh', 'peshin', 'asr', 'shom', 'xufton']
-    labels = {'bomdod':'Bomdod','quyosh':'Quyosh','peshin':'Peshin','asr':'Asr','shom':'Shom','xufton':'Xufton'}
-    lines = []
-    for k in order:
-        v = times.get(k) or times.get(k.capitalize()) or times.get(k.upper()) or "—:--"
-        lines.append(f"{labels.get(k, k)}: {v[:5]}")
-    await send_queued_message(c.message.chat.id, c.from_user.id, "🕌 Namoz vaqtlari (bugun):\n\n" + "\n".join(lines))
+    await send_queued_message(c.message.chat.id, c.from_user.id, text)
 
 @dp.callback_query(lambda c: c.data == "menu:duos")
 async def cb_duos(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     is_adm = await is_admin_db(c.from_user.id, ADMINS)
-    db_duos = await list_duos()
-    items = list(BUILTIN_DUOS.items()) + [(t, tx) for _, t, tx in db_duos]
-
-    rows = []
-    if is_adm:
-        rows.append([InlineKeyboardButton(text="➕ Duo qo'shish", callback_data="duos:add"),
-                     InlineKeyboardButton(text="🗑 Duo o'chirish (admin)", callback_data="duos:admin_delete")])
-    for i, (title, _) in enumerate(items):
-        label = title if len(title) <= 30 else title[:27] + "..."
-        rows.append([InlineKeyboardButton(text=label, callback_data=f"duo_open:{i}")])
-    rows.append([InlineKeyboardButton(text="🔙 Orqaga", callback_data="duos:back")])
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
-    await send_queued_message(c.message.chat.id, c.from_user.id, "🤲 Duolar:", reply_markup=kb)
+    await send_queued_message(c.message.chat.id, c.from_user.id, "🤲 Duolar:", reply_markup=duo_menu_kb(is_adm))
 
 @dp.callback_query(F.data.startswith("duos:"))
 async def cb_duos_actions(c: CallbackQuery, state: FSMContext):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     action = c.data.split(":", 1)[1]
     if action == "back":
         await send_queued_message(c.message.chat.id, c.from_user.id, "Orqaga", reply_markup=build_main_inline())
         return
+    if action.startswith("page:"):
+        try:
+            page = int(action.split(":", 1)[1])
+        except ValueError:
+            return
+        is_adm = await is_admin_db(c.from_user.id, ADMINS)
+        return await turn_page(c, duo_menu_kb(is_adm, page))
     if action == "add":
         if not await is_admin_db(c.from_user.id, ADMINS):
             return await send_queued_message(c.message.chat.id, c.from_user.id, "Admin emassiz.")
@@ -795,39 +1059,31 @@ async def cb_duos_actions(c: CallbackQuery, state: FSMContext):
     if action == "admin_delete":
         if not await is_admin_db(c.from_user.id, ADMINS):
             return await send_queued_message(c.message.chat.id, c.from_user.id, "Admin emassiz.")
-        db_duos = await list_duos()
-        if not db_duos:
+        kb = await duo_delete_kb()
+        if not kb:
             return await send_queued_message(c.message.chat.id, c.from_user.id, "Bazada duo yo'q.")
-        rows = []
-        for id_, title, _ in db_duos:
-            rows.append([InlineKeyboardButton(text=title[:30], callback_data=f"duo_del:{id_}")])
-        rows.append([InlineKeyboardButton(text="🔙 Bekor", callback_data="duo_del:cancel")])
-        kb = InlineKeyboardMarkup(inline_keyboard=rows)
         await send_queued_message(c.message.chat.id, c.from_user.id, "Qaysi duoni o'chirmoqchisiz?", reply_markup=kb)
         return
 
 @dp.callback_query(F.data.startswith("duo_open:"))
 async def cb_duo_open(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
-    try:
-        idx = int(c.data.split(":", 1)[1])
-    except:
-        return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato.")
-    db_duos = await list_duos()
-    items = list(BUILTIN_DUOS.items()) + [(t, tx) for _, t, tx in db_duos]
-    if idx >= len(items):
-        return await send_queued_message(c.message.chat.id, c.from_user.id, "Duo topilmadi.")
-    title, text = items[idx]
-    await increment_duo_stat(title)
+    key = c.data.split(":", 1)[1]
+    if key.isdigit():
+        # Eski (pozitsiyali) tugmalar: faqat ichki duolarning o'rni o'zgarmaydi ("b<n>"),
+        # bazadagilar o'chirilganda siljiydi - ular uchun yangi menyu yuboriladi
+        key = f"b{key}"
+    duo = DUOS.get(key)
+    if not duo:
+        is_adm = await is_admin_db(c.from_user.id, ADMINS)
+        return await send_queued_message(c.message.chat.id, c.from_user.id, "Duo topilmadi.", reply_markup=duo_menu_kb(is_adm))
+    title, text = duo
+    DUO_OPENS.incr(title)
     await send_queued_message(c.message.chat.id, c.from_user.id, f"🤲 {title}\n\n{text}")
 
 @dp.callback_query(F.data.startswith("duo_del:"))
 async def cb_duo_del(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     payload = c.data.split(":", 1)[1]
     if payload == "cancel":
         try:
@@ -835,11 +1091,18 @@ async def cb_duo_del(c: CallbackQuery):
         except:
             pass
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Bekor qilindi.")
+    cursor = page_cursor(payload)
+    if cursor:
+        if await is_admin_db(c.from_user.id, ADMINS):
+            await turn_page(c, await duo_delete_kb(*cursor))
+        return
     try:
         duo_id = int(payload)
     except:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato.")
-    await delete_duo(duo_id)
+    deleted_title = await DUOS.delete(duo_id)
+    if deleted_title:
+        DUO_OPENS.discard(deleted_title)
     title = f"Duo #{duo_id}" # Simplified feedback
     try:
         await c.message.edit_text(f"✅ Duo '{title}' o'chirildi.")
@@ -868,15 +1131,13 @@ async def duo_text(m: Message, state: FSMContext):
     title = data.get('title') or "No title"
     data = await state.get_data()
     title = data.get('title') or "No title"
-    await add_duo(title, m.text.strip(), m.from_user.id)
+    await DUOS.add(title, m.text.strip(), m.from_user.id)
     await m.answer("Duo saqlandi ✅")
     await state.clear()
 
 @dp.callback_query(lambda c: c.data == "menu:videos")
 async def cb_videos_menu(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     # Clear region selection (dynamic menu requirement)
     await set_user_region(c.from_user.id, None)
     await send_queued_message(c.message.chat.id, c.from_user.id, "Domlolar va Hadislar videolari:", reply_markup=video_kind_kb())
@@ -884,18 +1145,15 @@ async def cb_videos_menu(c: CallbackQuery):
 @dp.callback_query(F.data.startswith("watch:"))
 async def cb_watch(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
-    # Check for video navigation spam
-    if is_video_nav_spam(c.from_user.id):
-        return
     kind = c.data.split(":", 1)[1]
     playlist = get_filtered(kind)
     if not playlist:
         return await send_queued_message(c.message.chat.id, c.from_user.id, f"Bu turda video hali yo'q.")
     idx = 0
-    CURRENT_INDEX[c.message.chat.id] = idx
-    AUTO_PLAY[c.message.chat.id] = False
+    session = SESSIONS.get(c.message.chat.id)
+    session.video_index = idx
+    session.autoplay = False
+    AUTOPLAY.cancel(c.message.chat.id)
     file_id = playlist[idx]["file_id"]
     prev = None
     nxt = 1 if len(playlist) > 1 else None
@@ -904,11 +1162,6 @@ async def cb_watch(c: CallbackQuery):
 @dp.callback_query(F.data.startswith("video:"))
 async def cb_video_nav(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
-    # Check for video navigation spam - prevent rapid button clicks
-    if is_video_nav_spam(c.from_user.id):
-        return
     parts = c.data.split(":")
     if len(parts) < 3:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato ma'lumot.")
@@ -927,42 +1180,46 @@ async def cb_video_nav(c: CallbackQuery):
 
     prev = idx - 1 if idx > 0 else None
     nxt = idx + 1 if idx + 1 < len(playlist) else None
-    autoplay = AUTO_PLAY.get(c.message.chat.id, False)
+    session = SESSIONS.get(c.message.chat.id)
+    autoplay = session.autoplay
     
     ok = await edit_tracked(c.message.chat.id, playlist[idx]["file_id"], prev, nxt, autoplay, kind)
     if ok:
-        CURRENT_INDEX[c.message.chat.id] = idx
+        session.video_index = idx
+        if autoplay:
+            # Qo'lda tanlangan video to'liq ko'rsatiladi, keyin avto-ijro davom etadi
+            AUTOPLAY.schedule(c.message.chat.id, autoplay_delay(playlist[idx]))
 
 @dp.callback_query(F.data.startswith("atoggle:"))
 async def cb_autoplay_toggle(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     parts = c.data.split(":")
     kind = parts[1] if len(parts) > 1 else "short"
     chat_id = c.message.chat.id
     
-    current = AUTO_PLAY.get(chat_id, False)
-    idx = CURRENT_INDEX.get(chat_id, 0)
+    session = SESSIONS.get(chat_id)
+    current = session.autoplay
+    idx = session.video_index
     playlist = get_filtered(kind)
     
     # Update or rebuild internal state
-    if chat_id not in CURRENT_INFO:
-        CURRENT_INFO[chat_id] = {"chat_id": chat_id, "message_id": c.message.message_id, "kind": kind}
+    if session.video_message_id is None:
+        session.video_message_id = c.message.message_id
+        session.video_kind = kind
 
     if current:
-        AUTO_PLAY[chat_id] = False
-        task = AUTO_TASKS.pop(chat_id, None)
-        if task:
-            task.cancel()
+        session.autoplay = False
+        AUTOPLAY.cancel(chat_id)
         await bot.edit_message_reply_markup(
             chat_id=chat_id, message_id=c.message.message_id,
             reply_markup=video_nav_kb(idx-1 if idx>0 else None, idx+1 if idx+1<len(playlist) else None, False, kind)
         )
     else:
-        AUTO_PLAY[chat_id] = True
-        task = asyncio.create_task(autoplay_worker(chat_id, idx))
-        AUTO_TASKS[chat_id] = task
+        session.autoplay = True
+        if idx < len(playlist):
+            AUTOPLAY.schedule(chat_id, autoplay_delay(playlist[idx]))
+        else:
+            session.autoplay = False
         await bot.edit_message_reply_markup(
             chat_id=chat_id, message_id=c.message.message_id,
             reply_markup=video_nav_kb(idx-1 if idx>0 else None, idx+1 if idx+1<len(playlist) else None, True, kind)
@@ -979,9 +1236,33 @@ async def cmd_admin(m: Message):
 async def cmd_stats(m: Message):
     if not await is_admin_db(m.from_user.id, ADMINS):
         return
+    await ACTIVITY.flush()
     total = await count_users()
-    monthly = await count_active_users() # using active here as proxy or update later
-    await m.answer(f"📊 Statistika:\n\n👥 Jami userlar: {total}\n📅 Active: {monthly}")
+    monthly = await count_active_since(datetime.now() - timedelta(days=30))
+    cs = PRAYER_CACHE.stats()
+    ss = SESSIONS.stats()
+    ts = THROTTLE.stats()
+    shed = ", ".join(f"{reason} {n}" for reason, n in ts["shed"].items())
+    sources = "\n".join(
+        f"• {name}: {st['breaker']}, so'rov {st['requests']}, xato {st['errors']}, "
+        f"p50 {st['p50'] if st['p50'] is not None else '-'}s, p90 {st['p90'] if st['p90'] is not None else '-'}s"
+        for name, st in PRAYER_PIPELINE.metrics().items()
+    )
+    if PRAYER_DRIFT:
+        worst = max(PRAYER_DRIFT, key=PRAYER_DRIFT.get)
+        drift = f"max {PRAYER_DRIFT[worst]} daq ({worst}), {len(PRAYER_DRIFT)} viloyat tekshirilgan"
+    else:
+        drift = "hali tekshirilmagan"
+    await m.answer(
+        f"📊 Statistika:\n\n👥 Jami userlar: {total}\n📅 Active (30 kun): {monthly}\n\n"
+        f"🗂 Namoz kesh: {cs['size']}/{cs['maxsize']}, hit {cs['hits']}, stale {cs['stale_hits']}, miss {cs['misses']}, "
+        f"evict {cs['evictions']}, expired {cs['expirations']}\n\n"
+        f"🌐 Manbalar:\n{sources}\n\n"
+        f"📐 Hisob/tarmoq farqi: {drift}\n\n"
+        f"🧠 Sessiyalar: {ss['size']}/{ss['maxsize']}, chiqarilgan {ss['evictions']} "
+        f"(harakatsiz {ss['idle_evictions']}, limit {ss['overflow_evictions']})\n"
+        f"🚦 Callbacklar: o'tdi {ts['passed']}, tashlandi: {shed}"
+    )
 
 
 @dp.message(F.text == "📊 Statistika")
@@ -996,7 +1277,7 @@ async def admin_stats(m: Message):
         last30 = sum(1 for u in users if datetime.fromisoformat(u[4]) >= now - timedelta(days=30))
     except:
         last7 = last30 = 0
-    top = await get_top_duos(5)
+    top = await get_top_duos(5, pending=DUO_OPENS.pending())
     top_text = "\n".join(f"{i}. {n} — {o}" for i, (n, o) in enumerate(top, 1)) or "Hali ma'lumot yo'q"
     # Ad stats from db
     # We can fetch recent ads here, but let's keep it simple for now or implement get_recent_ads in db.py if needed.
@@ -1136,46 +1417,17 @@ async def broadcast_confirm(m: Message, state: FSMContext):
         await state.clear()
         return
     data = await state.get_data()
-    # Use optimized ID fetch
-    user_ids = await get_all_user_ids()
-    log.info(f"Broadcast boshlandi. Jami userlar: {len(user_ids)}")
-    await m.answer(f"Broadcast boshlandi. Jami userlar: {len(user_ids)}")
-    
-    sent = failed = 0
-    
-    caption = data.get("caption", "")
-    content = data["content"]
-    kind = data["kind"]
-    
-    for uid in user_ids:
-        try:
-            if kind == "text":
-                await bot.send_message(uid, content, parse_mode="HTML")
-            elif kind == "photo":
-                if caption:
-                    await bot.send_photo(uid, photo=content, caption=caption, parse_mode="HTML")
-                else:
-                    await bot.send_photo(uid, photo=content, parse_mode="HTML")
-            elif kind == "video":
-                if caption:
-                    await bot.send_video(uid, video=content, caption=caption, parse_mode="HTML")
-                else:
-                    await bot.send_video(uid, video=content, parse_mode="HTML")
-            sent += 1
-            await asyncio.sleep(0.05)
-        except Exception as e:
-            failed += 1
-            log.error(f"Broadcast error for {uid}: {e}")
-            print("Broadcast error:", uid, e)
-    
-    log.info(f"Broadcast tugadi. Sent: {sent}, Failed: {failed}")
-    ad_id = data.get("ad_id")
-    meta = f"sent:{sent},failed:{failed}"
-    if ad_id:
-        await update_ad_sent_count(ad_id, sent, meta)
-    await m.answer(f"Reklama yuborildi: {sent} ta, xato: {failed} ta")
+    total = await count_users()
+    log.info(f"Broadcast boshlandi. Jami userlar: {total}")
+    await m.answer(f"Broadcast boshlandi. Jami userlar: {total}")
     await state.clear()
 
+    # Yuborish fonda ketadi, admin FSM bloklanmaydi; restartdan keyin davom etadi
+    ad_id = data.get("ad_id")
+    payload = {"kind": data["kind"], "content": data["content"], "caption": data.get("caption", "")}
+    job_id = await create_broadcast_job(f"ad:{ad_id}", "ad", payload, ad_id=ad_id, admin_chat_id=m.chat.id)
+    start_broadcast_job(job_id)
+
 # Video admin handlers (add/remove implemented earlier)
 @dp.message(F.text == "🎬 Video qo'shish")
 async def video_add_start(m: Message, state: FSMContext):
@@ -1191,7 +1443,7 @@ async def video_add(m: Message, state: FSMContext):
         return
     fid = m.video.file_id
     dur = m.video.duration
-    pos, kind = add_video_fileid(fid, dur)
+    pos, kind = await add_video_fileid(fid, dur)
     await m.answer(f"✅ Video saqlandi\nPozitsiya: {pos}\nTuri: {kind}\nDavomiylik: {dur or '?'} soniya")
     await state.clear()
 
@@ -1200,28 +1452,21 @@ async def video_direct_add(m: Message):
     if not await is_admin_db(m.from_user.id, ADMINS):
         return
     dur = m.video.duration
-    pos, kind = add_video_fileid(m.video.file_id, dur)
+    pos, kind = await add_video_fileid(m.video.file_id, dur)
     await m.answer(f"✅ Avto saqlandi\nPozitsiya: {pos}\nTuri: {kind}")
 
 @dp.message(F.text == "🗑 Video o'chirish")
 async def video_del_start(m: Message, state: FSMContext):
     if not await is_admin_db(m.from_user.id, ADMINS):
         return
-    vids = load_videos()
-    if not vids:
+    kb = await video_delete_kb()
+    if not kb:
         return await m.answer("Video yo'q.")
-    rows = []
-    for i, v in enumerate(vids):
-        rows.append([InlineKeyboardButton(text=f"{i+1}. {v['kind']} ({v.get('duration','?')}s)", callback_data=f"delvid:{i+1}")])
-    rows.append([InlineKeyboardButton(text="❌ Bekor", callback_data="delvid:cancel")])
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
     await m.answer("Qaysi videoni o'chirmoqchisiz?", reply_markup=kb)
 
 @dp.callback_query(F.data.startswith("delvid:"))
 async def video_del_callback(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     payload = c.data.split(":", 1)[1]
     if payload == "cancel":
         try:
@@ -1229,11 +1474,16 @@ async def video_del_callback(c: CallbackQuery):
         except:
             pass
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Bekor qilindi.")
+    cursor = page_cursor(payload)
+    if cursor:
+        if await is_admin_db(c.from_user.id, ADMINS):
+            await turn_page(c, await video_delete_kb(*cursor))
+        return
     try:
         pos = int(payload)
     except:
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Xato raqam.")
-    ok, rem = remove_video_by_pos(pos)
+    ok, rem = await remove_video_by_pos(pos)
     if ok:
         try:
             await c.message.edit_text(f"🗑 #{pos} o'chirildi ({rem.get('kind')})")
@@ -1242,6 +1492,20 @@ async def video_del_callback(c: CallbackQuery):
     else:
         await send_queued_message(c.message.chat.id, c.from_user.id, "Bunday raqam yo'q.")
 
+@dp.message(Command("videomove"))
+async def cmd_video_move(m: Message):
+    if not await is_admin_db(m.from_user.id, ADMINS):
+        return
+    parts = (m.text or "").split()
+    try:
+        from_pos, to_pos = int(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        return await m.answer("Foydalanish: /videomove <qayerdan> <qayerga>\nMasalan: /videomove 5 1")
+    if await VIDEOS.move(from_pos, to_pos):
+        await m.answer(f"↕️ #{from_pos} video ko'chirildi")
+    else:
+        await m.answer("Bunday raqam yo'q.")
+
 # ---------------- ADMIN ADD / REMOVE ----------------
 @dp.message(F.text == "➕ Admin qo'shish")
 async def admin_add_start(m: Message, state: FSMContext):
@@ -1274,21 +1538,14 @@ async def admin_add_receive(m: Message, state: FSMContext):
 async def admin_remove_start(m: Message):
     if not await is_admin_db(m.from_user.id, ADMINS):
         return
-    admins = await get_all_admins()
-    if not admins:
+    kb = await admin_delete_kb()
+    if not kb:
         return await m.answer("Adminlar ro'yxatida hech kim yo'q.")
-    rows = []
-    for a in admins:
-        rows.append([InlineKeyboardButton(text=str(a), callback_data=f"admin_del:{a}")])
-    rows.append([InlineKeyboardButton(text="❌ Bekor", callback_data="admin_del:cancel")])
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
     await m.answer("Qaysi adminni o'chirmoqchisiz? (ID tanlang)", reply_markup=kb)
 
 @dp.callback_query(F.data.startswith("admin_del:"))
 async def admin_del_callback(c: CallbackQuery):
     await c.answer()
-    if is_duplicate_callback(c.from_user.id, c.data):
-        return
     payload = c.data.split(":", 1)[1]
     if payload == "cancel":
         try:
@@ -1296,6 +1553,11 @@ async def admin_del_callback(c: CallbackQuery):
         except:
             pass
         return await send_queued_message(c.message.chat.id, c.from_user.id, "Bekor qilindi.")
+    cursor = page_cursor(payload)
+    if cursor:
+        if await is_admin_db(c.from_user.id, ADMINS):
+            await turn_page(c, await admin_delete_kb(*cursor))
+        return
     try:
         aid = int(payload)
     except:
@@ -1309,14 +1571,37 @@ async def admin_del_callback(c: CallbackQuery):
         await send_queued_message(c.message.chat.id, c.from_user.id, f"✅ Admin {aid} o'chirildi.")
 
 # ---------------- STARTUP ----------------
+async def write_behind_loop():
+    while True:
+        await asyncio.sleep(WRITE_BEHIND_INTERVAL)
+        for buffer in (ACTIVITY, DUO_OPENS):
+            try:
+                await buffer.flush()
+            except Exception as e:
+                log.exception("write_behind_loop error: %s", e)
+        # Yangi sessiya yaratilmasa ham harakatsizlari bo'shatiladi
+        SESSIONS.sweep()
+
 async def periodic_cache():
+    # Hisob rejimida birinchi tekshiruv shu yerda (fonda), aks holda on_startup da
+    if not PRAYER_CALC:
+        await asyncio.sleep(CACHE_REFRESH_INTERVAL)
     while True:
         await refresh_prayer_cache_for_all()
         await asyncio.sleep(CACHE_REFRESH_INTERVAL)
 
 async def on_startup():
+    await open_db()
+    await open_http()
     await init_db(INITIAL_ADMINS)
+    imported = await import_videos_json(VIDEO_DATA_FILE)
+    if imported:
+        log.info("videos.json dan %s video bazaga ko'chirildi", imported)
+    await VIDEOS.load()
+    await DUOS.load()
     
+    # Takroriy/tez bosishlar handler va DB dan oldin tashlanadi
+    dp.callback_query.outer_middleware(THROTTLE)
     dp.message.middleware(UserActivityMiddleware())
     dp.callback_query.middleware(UserActivityMiddleware())
     
@@ -1326,15 +1611,41 @@ async def on_startup():
     ADMINS = admin_ids if admin_ids else list(INITIAL_ADMINS)
     
     log.info("DB tayyor, admins: %s", ADMINS)
-    await refresh_prayer_cache_for_all()
+    await warm_prayer_cache()
+    await resume_broadcast_jobs()
+    if PRAYER_CALC:
+        calculated_times("toshkent-shahri", now_tashkent_date())  # yillik jadvalni oldindan hisoblash
+        asyncio.create_task(prerender_screens())
+    else:
+        await refresh_prayer_cache_for_all()
     asyncio.create_task(periodic_cache())
     asyncio.create_task(ramadan_check_loop())
     asyncio.create_task(daily_namaz_updater_loop())
+    asyncio.create_task(write_behind_loop())
+    AUTOPLAY.start()
+
+async def on_shutdown():
+    # Broadcastlar checkpointdan keyin davom etadi, shuning uchun to'xtatish xavfsiz
+    tasks = list(BROADCAST_JOBS.values()) + list(PRAYER_REVALIDATIONS.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await AUTOPLAY.stop()
+    for buffer in (ACTIVITY, DUO_OPENS):
+        try:
+            await buffer.flush()
+        except Exception as e:
+            log.exception("Write-behind flush on shutdown failed: %s", e)
+    await close_http()
+    await close_db()
 
 async def main():
     await on_startup()
     log.info("Bot ishga tushdi")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await on_shutdown()
 
 if __name__ == "__main__":
     try:
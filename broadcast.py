@@ -0,0 +1,214 @@
+"""
+Ommaviy xabar yuborish (broadcast) dvigateli.
+
+Bir nechta parallel yuboruvchi (worker) umumiy token bucket orqali
+Telegram limitiga (~30 xabar/sekund) rioya qilgan holda ishlaydi.
+Navbatdagi ishlar (jobs) SQLite'da saqlanadi va restartdan keyin
+oxirgi checkpointdan davom ettiriladi. Flood-control (RetryAfter)
+xatolarida tezlik AIMD bo'yicha pasaytiriladi va user navbatga qaytadi.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from db import (
+    get_broadcast_job, get_pending_recipients, checkpoint_broadcast_job,
+    set_broadcast_job_status
+)
+
+log = logging.getLogger(__name__)
+
+# Bu turdagi ishlar user_id bo'yicha tartibli yuriladi va faqat last_user_id
+# checkpointiga tayanadi - har kungi menyu uchun har bir userga ledger qatori yozilmaydi
+CHECKPOINT_ONLY_KINDS = ("daily_menu",)
+
+
+class TokenBucket:
+    """Global rate limiter: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        # _updated kelajakda bo'lishi mumkin (pauza oxiri) - unda hali to'ldirilmaydi
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        # Lock keeps waiters in FIFO order so no sender starves
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        pass
+
+    def on_retry_after(self, seconds: float):
+        pass
+
+
+class AdaptivePacer(TokenBucket):
+    """
+    Token bucket whose rate follows AIMD: every successful send adds
+    `increase / rate` msg/s (about +`increase` per second of traffic),
+    every flood-control error multiplies the rate by `decrease` and
+    pauses all senders for the server's `retry_after`. The burst size
+    follows the rate, and nothing refills during a pause.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float = 1.0,
+                 increase: float = 1.0, decrease: float = 0.5):
+        super().__init__(max_rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self._burst = self.capacity / self.rate  # sekundlarda, tezlik bilan birga o'zgaradi
+        self._paused_until = 0.0
+
+    def _set_rate(self, rate: float):
+        self.rate = rate
+        self.capacity = rate * self._burst
+        self._tokens = min(self._tokens, self.capacity)
+
+    async def acquire(self):
+        while True:
+            wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        await super().acquire()
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self._refill()
+            self._set_rate(min(self.max_rate, self.rate + self.increase / self.rate))
+
+    def on_retry_after(self, seconds: float):
+        self._refill()
+        self._set_rate(max(self.min_rate, self.rate * self.decrease))
+        self._tokens = 0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Tokenlar pauza tugagandan keyingina to'planadi
+        self._updated = max(self._updated, self._paused_until)
+        log.warning("Flood control: %ss pauza, yangi tezlik %.1f msg/s", seconds, self.rate)
+
+
+async def broadcast(
+    user_ids: Iterable[int],
+    send: Callable[[int], Awaitable[None]],
+    bucket: TokenBucket,
+    workers: int = 8,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    progress_every: int = 500,
+    max_retries: int = 5,
+):
+    """
+    Send to every user id with a bounded pool of concurrent senders.
+    Each send takes one token from `bucket`. Recipients hit by flood
+    control are put back in the queue (up to `max_retries` times) instead
+    of being counted as failed. Returns (sent, failed).
+    """
+    queue = asyncio.Queue()
+    for uid in user_ids:
+        queue.put_nowait((uid, 0))
+    total = queue.qsize()
+    counts = {"sent": 0, "failed": 0}
+
+    async def worker():
+        while True:
+            uid, attempt = await queue.get()
+            try:
+                await bucket.acquire()
+                try:
+                    await send(uid)
+                    counts["sent"] += 1
+                    bucket.on_success()
+                except TelegramRetryAfter as e:
+                    bucket.on_retry_after(e.retry_after)
+                    if attempt < max_retries:
+                        queue.put_nowait((uid, attempt + 1))
+                        continue
+                    counts["failed"] += 1
+                    log.warning("Broadcast gave up on %s after %s retries", uid, attempt)
+                except Exception as e:
+                    counts["failed"] += 1
+                    log.warning("Broadcast error for %s: %s", uid, e)
+                done = counts["sent"] + counts["failed"]
+                if on_progress and done % progress_every == 0 and done < total:
+                    try:
+                        await on_progress(counts["sent"], counts["failed"])
+                    except Exception:
+                        log.exception("Broadcast progress callback failed")
+            finally:
+                queue.task_done()
+
+    pool = max(1, min(workers, total))
+    tasks = [asyncio.create_task(worker()) for _ in range(pool)]
+    try:
+        await queue.join()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return counts["sent"], counts["failed"]
+
+
+async def run_job(
+    job_id: int,
+    send: Callable[[int], Awaitable[None]],
+    bucket: TokenBucket,
+    workers: int = 8,
+    batch_size: int = 200,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+):
+    """
+    Deliver a stored broadcast job batch by batch. After every batch the
+    delivery ledger and the last user_id are checkpointed, so a restarted
+    worker continues where the previous one stopped. Returns (sent, failed).
+    """
+    job = await get_broadcast_job(job_id)
+    if not job:
+        return 0, 0
+    sent, failed = job["sent"], job["failed"]
+    if job["status"] not in ("pending", "running"):
+        return sent, failed
+    await set_broadcast_job_status(job_id, "running")
+    last_uid = job["last_user_id"] or 0
+    ledger = job["kind"] not in CHECKPOINT_ONLY_KINDS
+    while True:
+        batch = await get_pending_recipients(job_id, last_uid, batch_size, ledger=ledger)
+        if not batch:
+            break
+        delivered = set()
+
+        async def tracked(uid: int):
+            await send(uid)
+            delivered.add(uid)
+
+        await broadcast(batch, tracked, bucket, workers=workers)
+        results = [(uid, "sent" if uid in delivered else "failed") for uid in batch]
+        last_uid = batch[-1]
+        sent, failed = await checkpoint_broadcast_job(job_id, results, last_uid, ledger=ledger)
+        if on_progress:
+            try:
+                await on_progress(sent, failed)
+            except Exception:
+                log.exception("Broadcast progress callback failed")
+    await set_broadcast_job_status(job_id, "done")
+    log.info("Broadcast job %s done: %s sent, %s failed", job_id, sent, failed)
+    return sent, failed
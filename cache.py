@@ -0,0 +1,166 @@
+"""
+Xotiradagi cheklangan kesh: TTL bo'yicha eskiradi, hajmi oshsa eng kam
+ishlatilgan (LRU) yozuv chiqariladi. Hit/miss/eviction hisoblagichlari bor.
+`stale_ttl` berilsa, eskirgan yozuv yana shuncha vaqt saqlanadi va
+get_stale() orqali (stale-while-revalidate uchun) qaytarilishi mumkin.
+SingleFlight bir xil kalit uchun parallel so'rovlarni bittaga birlashtiradi.
+DailyMemo kun almashganda (masalan Toshkent yarim tuni) to'liq tozalanadi.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded mapping with per-entry expiry and LRU eviction"""
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (value, fresh_until)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key: Hashable):
+        """(value, fresh_until) or None; drops entries past their stale window"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] + self.stale_ttl <= time.time():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None):
+        entry = self._lookup(key)
+        if entry is None or entry[1] <= time.time():
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_stale(self, key: Hashable):
+        """
+        (value, is_stale) while the entry is fresh or within `stale_ttl`
+        past its expiry, otherwise None.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        value, fresh_until = entry
+        if fresh_until <= time.time():
+            self.stale_hits += 1
+            return value, True
+        self.hits += 1
+        return value, False
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None, stored_at: Optional[float] = None):
+        """Store `value`; it expires `ttl` seconds after `stored_at` (default: now)"""
+        fresh_until = (stored_at if stored_at is not None else time.time()) + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, fresh_until)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None):
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable):
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.time()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """
+    At most one in-flight call per key: concurrent callers await the same
+    task and share its result or exception.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> asyncio.Task
+
+    async def do(self, key: Hashable, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: bitta chaqiruvchi bekor qilinsa, umumiy so'rov to'xtamaydi
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # "exception was never retrieved" ogohlantirishini oldini oladi
+
+    def __contains__(self, key: Hashable):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+class DailyMemo:
+    """
+    Memoized values that are all dropped as soon as `today()` returns a
+    different value. `maxsize` only guards against unbounded keys.
+    """
+
+    def __init__(self, today: Callable[[], Hashable], maxsize: int = 4096):
+        self.today = today
+        self.maxsize = maxsize
+        self._day = None
+        self._data = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]):
+        day = self.today()
+        if day != self._day:
+            self._data.clear()
+            self._day = day
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            if len(self._data) >= self.maxsize:
+                self._data.clear()
+            value = self._data[key] = build()
+            return value
+        self.hits += 1
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
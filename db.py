@@ -1,13 +1,115 @@
 import aiosqlite
 import logging
 import asyncio
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Optional
 
 DB_NAME = "ramazon.db"
 log = logging.getLogger(__name__)
 
+# --- Connection ---
+# Bitta uzoq yashovchi ulanish: har chaqiruvda yangi thread/fayl ochilmaydi.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-16000",     # ~16 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+STATEMENT_CACHE_SIZE = 256          # sqlite3 prepared statement cache
+
+_conn: Optional[aiosqlite.Connection] = None
+_write_lock = asyncio.Lock()
+
+async def open_db():
+    """Open the shared connection (idempotent)"""
+    global _conn
+    if _conn is None:
+        conn = await aiosqlite.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        _conn = conn
+        log.info("DB ulanishi ochildi: %s", DB_NAME)
+    return _conn
+
+async def close_db():
+    """Close the shared connection on shutdown"""
+    global _conn
+    if _conn is not None:
+        conn, _conn = _conn, None
+        try:
+            await conn.execute("PRAGMA optimize")
+        finally:
+            await conn.close()
+        log.info("DB ulanishi yopildi")
+
+@asynccontextmanager
+async def _read():
+    yield await open_db()
+
+@asynccontextmanager
+async def _write():
+    """One write transaction at a time on the shared connection"""
+    db = await open_db()
+    async with _write_lock:
+        try:
+            yield db
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+# --- Keyset pagination ---
+# Sahifa OFFSET bilan emas, indekslangan kalit bo'yicha olinadi: qo'shni
+# sahifaning chegaraviy kalitidan boshlab `limit + 1` qator o'qiladi, shuning
+# uchun sahifa narxi jadval hajmiga bog'liq emas.
+async def _keyset_page(table, columns, key, after=None, before=None, limit=10):
+    """
+    One page of `table` ordered by the indexed unique column `key`:
+    rows after `after` (next page), before `before` (previous page), or
+    the first page. Returns (rows, has_prev, has_next).
+    """
+    cols = ", ".join(columns)
+    if before is not None:
+        sql = f"SELECT {cols} FROM {table} WHERE {key} < ? ORDER BY {key} DESC LIMIT ?"
+        params = (before, limit + 1)
+    elif after is not None:
+        sql = f"SELECT {cols} FROM {table} WHERE {key} > ? ORDER BY {key} ASC LIMIT ?"
+        params = (after, limit + 1)
+    else:
+        sql = f"SELECT {cols} FROM {table} ORDER BY {key} ASC LIMIT ?"
+        params = (limit + 1,)
+    key_index = columns.index(key)
+    async with _read() as db:
+        async with db.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            if after is None and before is None:
+                return [], False, False
+            # Chegaradagi yozuvlar o'chirilgan bo'lsa - birinchi sahifa
+            return await _keyset_page(table, columns, key, limit=limit)
+        # Qarama-qarshi tomonda yozuv borligini indeks bo'yicha bitta EXISTS bilan tekshiramiz
+        if before is not None:
+            rows.reverse()
+            has_prev = more
+            has_next = await _exists(db, f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {key} > ?)", rows[-1][key_index])
+        else:
+            has_next = more
+            has_prev = after is not None and await _exists(
+                db, f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {key} < ?)", rows[0][key_index])
+    return rows, has_prev, has_next
+
+async def _exists(db, sql, value):
+    async with db.execute(sql, (value,)) as cursor:
+        return bool((await cursor.fetchone())[0])
+
 async def init_db(initial_admins: list):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         # Users table with region and active status
         await db.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -20,6 +122,7 @@ async def init_db(initial_admins: list):
             last_active TEXT
         )
         """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_last_active ON users (last_active)")
         
         # Admins
         await db.execute("CREATE TABLE IF NOT EXISTS admins (admin_id INTEGER PRIMARY KEY)")
@@ -57,6 +160,59 @@ async def init_db(initial_admins: list):
         )
         """)
         
+        # Broadcast jobs (resumable) and per-recipient delivery ledger
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_key TEXT UNIQUE,
+            kind TEXT,
+            payload TEXT,
+            ad_id INTEGER,
+            admin_chat_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            last_user_id INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT
+        )
+        """)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER,
+            user_id INTEGER,
+            status TEXT,
+            delivered_at TEXT,
+            PRIMARY KEY (job_id, user_id)
+        ) WITHOUT ROWID
+        """)
+        
+        # Prayer times (persistent cache behind the in-memory one)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS prayer_times (
+            region TEXT,
+            date TEXT,
+            source TEXT,
+            fetched_at TEXT,
+            times TEXT,
+            PRIMARY KEY (date, region)
+        ) WITHOUT ROWID
+        """)
+        
+        # Videos (short/long playlists, admin list order = position)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id TEXT NOT NULL,
+            duration INTEGER,
+            kind TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            added_at TEXT
+        )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_position ON videos (position)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_kind ON videos (kind, position)")
+        
         # Meta (key-value storage)
         await db.execute("""
         CREATE TABLE IF NOT EXISTS meta (
@@ -65,17 +221,14 @@ async def init_db(initial_admins: list):
         )
         """)
         
-        await db.commit()
-        
         # Seed admins
         for a in initial_admins:
             await db.execute("INSERT OR IGNORE INTO admins (admin_id) VALUES (?)", (a,))
-        await db.commit()
 
 # --- User Management ---
 async def add_user(uid, first, username=None):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         # Check if exists to preserve joined_at
         async with db.execute("SELECT joined_at FROM users WHERE user_id = ?", (uid,)) as cursor:
             row = await cursor.fetchone()
@@ -92,86 +245,110 @@ async def add_user(uid, first, username=None):
                 "INSERT INTO users (user_id, first_name, username, joined_at, is_active, last_active) VALUES (?, ?, ?, ?, 1, ?)",
                 (uid, first, username, now, now)
             )
-        await db.commit()
+
+async def touch_users(rows):
+    """
+    Bulk UPSERT of (user_id, first_name, username, last_active) rows
+    collected by the activity tracker.
+    """
+    async with _write() as db:
+        await db.executemany(
+            "INSERT INTO users (user_id, first_name, username, joined_at, is_active, last_active) "
+            "VALUES (?1, ?2, ?3, ?4, 1, ?4) "
+            "ON CONFLICT(user_id) DO UPDATE SET first_name=excluded.first_name, username=excluded.username, "
+            "is_active=1, last_active=excluded.last_active",
+            rows
+        )
 
 async def set_user_region(uid, region_slug):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("UPDATE users SET region = ? WHERE user_id = ?", (region_slug, uid))
-        await db.commit()
 
 async def set_user_inactive(uid):
     """Mark user as blocked/inactive"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("UPDATE users SET is_active = 0 WHERE user_id = ?", (uid,))
-        await db.commit()
 
 async def get_user(uid):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT * FROM users WHERE user_id = ?", (uid,)) as cursor:
             return await cursor.fetchone()
 
 async def get_all_users():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT * FROM users") as cursor:
             return await cursor.fetchall()
 
 async def get_all_user_ids():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT user_id FROM users") as cursor:
             rows = await cursor.fetchall()
             return [r[0] for r in rows]
 
 async def count_users():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT COUNT(*) FROM users") as cursor:
             return (await cursor.fetchone())[0]
 
 async def count_active_users():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT COUNT(*) FROM users WHERE is_active=1") as cursor:
             return (await cursor.fetchone())[0]
 
+async def count_active_since(since):
+    """Users whose last_active is at or after `since` (datetime)"""
+    since_str = since.strftime("%Y-%m-%d %H:%M:%S")
+    async with _read() as db:
+        async with db.execute("SELECT COUNT(*) FROM users WHERE last_active >= ?", (since_str,)) as cursor:
+            return (await cursor.fetchone())[0]
+
 # --- Admin Management ---
 async def get_all_admins():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT admin_id FROM admins") as cursor:
             rows = await cursor.fetchall()
             return [r[0] for r in rows]
 
+async def page_admins(after=None, before=None, limit=10):
+    """Admin ids by id, one keyset page: (ids, has_prev, has_next)"""
+    rows, has_prev, has_next = await _keyset_page("admins", ("admin_id",), "admin_id", after, before, limit)
+    return [r[0] for r in rows], has_prev, has_next
+
 async def add_admin(uid):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("INSERT OR IGNORE INTO admins (admin_id) VALUES (?)", (uid,))
-        await db.commit()
 
 async def remove_admin(uid):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("DELETE FROM admins WHERE admin_id = ?", (uid,))
-        await db.commit()
 
 async def is_admin_db(uid, cached_list=None):
     if cached_list and uid in cached_list:
         return True
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT 1 FROM admins WHERE admin_id = ?", (uid,)) as cursor:
             return await cursor.fetchone() is not None
 
 # --- Duo Management ---
 async def add_duo(title, text, added_by):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("INSERT INTO duolar (title, text, added_by, created_at) VALUES (?, ?, ?, ?)",
-                         (title, text, added_by, now))
-        await db.commit()
+    async with _write() as db:
+        cursor = await db.execute("INSERT INTO duolar (title, text, added_by, created_at) VALUES (?, ?, ?, ?)",
+                                  (title, text, added_by, now))
         await db.execute("INSERT OR IGNORE INTO duo_stats (name, opens) VALUES (?, 0)", (title,))
-        await db.commit()
+        return cursor.lastrowid
 
 async def list_duos():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT id, title, text FROM duolar ORDER BY id ASC") as cursor:
             return await cursor.fetchall()
 
+async def page_duos(after=None, before=None, limit=10):
+    """(id, title) by id, one keyset page: (rows, has_prev, has_next)"""
+    return await _keyset_page("duolar", ("id", "title"), "id", after, before, limit)
+
 async def delete_duo(duo_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         # Get title first for stats
         async with db.execute("SELECT title FROM duolar WHERE id = ?", (duo_id,)) as cursor:
             row = await cursor.fetchone()
@@ -180,56 +357,310 @@ async def delete_duo(duo_id):
             title = row[0]
             await db.execute("DELETE FROM duolar WHERE id = ?", (duo_id,))
             await db.execute("DELETE FROM duo_stats WHERE name = ?", (title,))
-            await db.commit()
             return title
     return None
 
-async def increment_duo_stat(name):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("INSERT OR IGNORE INTO duo_stats (name, opens) VALUES (?, 0)", (name,))
-        await db.execute("UPDATE duo_stats SET opens = opens + 1, last_opened = ? WHERE name = ?", (now, name))
-        await db.commit()
-
-async def get_top_duos(limit=5):
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT name, opens FROM duo_stats ORDER BY opens DESC LIMIT ?", (limit,)) as cursor:
-            return await cursor.fetchall()
+async def add_duo_opens(rows):
+    """Apply batched (name, opens, last_opened) deltas in one transaction"""
+    async with _write() as db:
+        await db.executemany(
+            "INSERT INTO duo_stats (name, opens, last_opened) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET opens = opens + excluded.opens, last_opened = excluded.last_opened",
+            rows
+        )
+
+async def get_top_duos(limit=5, pending=None):
+    """
+    Most opened duos. `pending` is a {name: opens} dict of deltas that are
+    not flushed yet; they are merged in so the ranking stays exact.
+    """
+    if not pending:
+        async with _read() as db:
+            async with db.execute("SELECT name, opens FROM duo_stats ORDER BY opens DESC LIMIT ?", (limit,)) as cursor:
+                return await cursor.fetchall()
+    # Buferda yo'q duo natijaga faqat bazadagi top (limit + len(pending)) ichidan kira oladi,
+    # buferdagilarning esa bazadagi qiymati alohida olinadi
+    names = list(pending)
+    placeholders = ", ".join("?" * len(names))
+    async with _read() as db:
+        async with db.execute("SELECT name, opens FROM duo_stats ORDER BY opens DESC LIMIT ?",
+                              (limit + len(names),)) as cursor:
+            totals = dict(await cursor.fetchall())
+        async with db.execute(f"SELECT name, opens FROM duo_stats WHERE name IN ({placeholders})", names) as cursor:
+            totals.update(await cursor.fetchall())
+    for name, opens in pending.items():
+        totals[name] = totals.get(name, 0) + opens
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
 
 async def get_all_duo_stats():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT name, opens, last_opened FROM duo_stats ORDER BY opens DESC") as cursor:
             return await cursor.fetchall()
 
 # --- Ads Management ---
 async def add_ad(kind, content, meta, expires_at):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         cursor = await db.execute(
             "INSERT INTO ads (kind, content, meta, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
             (kind, content, meta, expires_at, now)
         )
-        await db.commit()
         return cursor.lastrowid
 
 async def update_ad_sent_count(ad_id, sent_count, meta=""):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("UPDATE ads SET sent_count = ?, meta = ? WHERE id = ?", (sent_count, meta, ad_id))
-        await db.commit()
 
 async def get_recent_ads(limit=5):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT id, kind, created_at, sent_count FROM ads ORDER BY created_at DESC LIMIT ?", (limit,)) as cursor:
             return await cursor.fetchall()
 
 # --- Meta ---
 async def set_meta(key, value):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _write() as db:
         await db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
-        await db.commit()
 
 async def get_meta(key):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with _read() as db:
         async with db.execute("SELECT value FROM meta WHERE key = ?", (key,)) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else None
+
+# --- Prayer Times ---
+async def save_prayer_times(rows):
+    """Upsert (region, date, source, fetched_at, times) rows in one transaction"""
+    async with _write() as db:
+        await db.executemany(
+            "INSERT OR REPLACE INTO prayer_times (region, date, source, fetched_at, times) VALUES (?, ?, ?, ?, ?)",
+            [(region, date, source, fetched_at, json.dumps(times, ensure_ascii=False))
+             for region, date, source, fetched_at, times in rows]
+        )
+
+async def load_prayer_times(date_from, date_to):
+    """All cached rows with date_from <= date <= date_to (YYYY-MM-DD)"""
+    async with _read() as db:
+        async with db.execute(
+            "SELECT region, date, source, fetched_at, times FROM prayer_times WHERE date BETWEEN ? AND ?",
+            (date_from, date_to)
+        ) as cursor:
+            rows = await cursor.fetchall()
+    return [(region, date, source, fetched_at, json.loads(times)) for region, date, source, fetched_at, times in rows]
+
+# --- Videos ---
+VIDEO_COLUMNS = ("id", "file_id", "duration", "kind", "position")
+
+def _read_videos_json(path):
+    """Valid entries of a legacy videos.json: [] if there is no file, None if it is unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:  # JSONDecodeError / UnicodeDecodeError ham ValueError
+        log.error("%s o'qilmadi, videolar ko'chirilmadi: %s", path, e)
+        return None
+    if not isinstance(data, list):
+        log.error("%s: ro'yxat kutilgan edi (%s), videolar ko'chirilmadi", path, type(data).__name__)
+        return None
+    videos = []
+    for i, v in enumerate(data, start=1):
+        if not isinstance(v, dict) or not isinstance(v.get("file_id"), str) or not v["file_id"]:
+            log.warning("%s: %s-yozuv o'tkazib yuborildi: %r", path, i, v)
+            continue
+        videos.append(v)
+    return videos
+
+async def import_videos_json(path):
+    """
+    One-time copy of the legacy videos.json into the videos table; returns
+    rows imported. Malformed entries are skipped; an unreadable file is
+    logged and left for the next start (the import is not marked done).
+    """
+    async with _read() as db:
+        async with db.execute("SELECT value FROM meta WHERE key = 'videos_imported'") as cursor:
+            if await cursor.fetchone():
+                return 0
+        async with db.execute("SELECT COUNT(*) FROM videos") as cursor:
+            existing = (await cursor.fetchone())[0]
+    videos = []
+    if not existing:
+        videos = _read_videos_json(path)
+        if videos is None:
+            return 0
+    async with _write() as db:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        await db.executemany(
+            "INSERT INTO videos (file_id, duration, kind, position, added_at) VALUES (?, ?, ?, ?, ?)",
+            [(v["file_id"], v.get("duration"), v.get("kind", "short"), i, now)
+             for i, v in enumerate(videos, start=1)]
+        )
+        await db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('videos_imported', ?)", (now,))
+    return len(videos)
+
+async def list_videos(kind=None):
+    """Videos ordered by position, optionally only one kind"""
+    sql = f"SELECT {', '.join(VIDEO_COLUMNS)} FROM videos"
+    params = ()
+    if kind is not None:
+        sql += " WHERE kind = ?"
+        params = (kind,)
+    async with _read() as db:
+        async with db.execute(sql + " ORDER BY position", params) as cursor:
+            rows = await cursor.fetchall()
+    return [dict(zip(VIDEO_COLUMNS, row)) for row in rows]
+
+async def page_videos(after=None, before=None, limit=10):
+    """Videos by position, one keyset page: (videos, has_prev, has_next)"""
+    rows, has_prev, has_next = await _keyset_page("videos", VIDEO_COLUMNS, "position", after, before, limit)
+    return [dict(zip(VIDEO_COLUMNS, row)) for row in rows], has_prev, has_next
+
+async def add_video(file_id, duration, kind):
+    """Append a video at the end of the list; returns its 1-based position"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    async with _write() as db:
+        cursor = await db.execute(
+            "INSERT INTO videos (file_id, duration, kind, position, added_at) "
+            "SELECT ?, ?, ?, COALESCE(MAX(position), 0) + 1, ? FROM videos",
+            (file_id, duration, kind, now)
+        )
+        async with db.execute("SELECT position FROM videos WHERE id = ?", (cursor.lastrowid,)) as cur:
+            return (await cur.fetchone())[0]
+
+async def remove_video_at(pos):
+    """Delete the video at `pos` and close the gap; returns the removed row or None"""
+    async with _write() as db:
+        async with db.execute(
+            f"SELECT {', '.join(VIDEO_COLUMNS)} FROM videos WHERE position = ?", (pos,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        await db.execute("DELETE FROM videos WHERE id = ?", (row[0],))
+        await db.execute("UPDATE videos SET position = position - 1 WHERE position > ?", (pos,))
+    return dict(zip(VIDEO_COLUMNS, row))
+
+async def move_video(from_pos, to_pos):
+    """Move the video at `from_pos` to `to_pos` (clamped), shifting the ones between"""
+    async with _write() as db:
+        async with db.execute("SELECT id FROM videos WHERE position = ?", (from_pos,)) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return False
+        async with db.execute("SELECT MAX(position) FROM videos") as cursor:
+            last = (await cursor.fetchone())[0]
+        to_pos = max(1, min(to_pos, last))
+        if to_pos > from_pos:
+            await db.execute(
+                "UPDATE videos SET position = position - 1 WHERE position > ? AND position <= ?",
+                (from_pos, to_pos)
+            )
+        elif to_pos < from_pos:
+            await db.execute(
+                "UPDATE videos SET position = position + 1 WHERE position >= ? AND position < ?",
+                (to_pos, from_pos)
+            )
+        await db.execute("UPDATE videos SET position = ? WHERE id = ?", (to_pos, row[0]))
+    return True
+
+# --- Broadcast Jobs ---
+JOB_COLUMNS = ("id", "job_key", "kind", "payload", "ad_id", "admin_chat_id",
+               "status", "last_user_id", "sent", "failed", "created_at", "updated_at")
+
+def _job_from_row(row):
+    if not row:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    job["payload"] = json.loads(job["payload"] or "{}")
+    return job
+
+async def create_broadcast_job(job_key, kind, payload, ad_id=None, admin_chat_id=None):
+    """Create a job once per job_key; returns the id of the new or existing job"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO broadcast_jobs (job_key, kind, payload, ad_id, admin_chat_id, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_key, kind, json.dumps(payload, ensure_ascii=False), ad_id, admin_chat_id, now, now)
+        )
+        async with db.execute("SELECT id FROM broadcast_jobs WHERE job_key = ?", (job_key,)) as cursor:
+            return (await cursor.fetchone())[0]
+
+async def get_broadcast_job(job_id):
+    async with _read() as db:
+        async with db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs WHERE id = ?", (job_id,)) as cursor:
+            return _job_from_row(await cursor.fetchone())
+
+async def get_broadcast_job_by_key(job_key):
+    async with _read() as db:
+        async with db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs WHERE job_key = ?", (job_key,)) as cursor:
+            return _job_from_row(await cursor.fetchone())
+
+async def get_unfinished_broadcast_jobs():
+    async with _read() as db:
+        async with db.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM broadcast_jobs WHERE status IN ('pending', 'running') ORDER BY id ASC"
+        ) as cursor:
+            return [_job_from_row(r) for r in await cursor.fetchall()]
+
+FINISHED_JOB_STATUSES = ("done", "expired")
+
+async def set_broadcast_job_status(job_id, status):
+    """Set a job's status; a finished job's delivery ledger is dropped in the same transaction"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    async with _write() as db:
+        await db.execute("UPDATE broadcast_jobs SET status = ?, updated_at = ? WHERE id = ?", (status, now, job_id))
+        if status in FINISHED_JOB_STATUSES:
+            # Jami sent/failed jobda qoladi, har bir user qatori endi kerak emas
+            await db.execute("DELETE FROM broadcast_deliveries WHERE job_id = ?", (job_id,))
+
+async def prune_broadcast_deliveries():
+    """Drop ledger rows left behind by finished jobs; returns how many were deleted"""
+    async with _write() as db:
+        cursor = await db.execute(
+            "DELETE FROM broadcast_deliveries WHERE job_id IN "
+            f"(SELECT id FROM broadcast_jobs WHERE status IN ({', '.join('?' * len(FINISHED_JOB_STATUSES))}))",
+            FINISHED_JOB_STATUSES
+        )
+        return cursor.rowcount
+
+async def get_pending_recipients(job_id, after_user_id, limit, ledger=True):
+    """
+    Next user ids after the checkpoint. With `ledger`, users that already
+    have a delivery record for this job are skipped too; without it the
+    ordered walk past `after_user_id` is the only bookkeeping.
+    """
+    if not ledger:
+        sql = "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id ASC LIMIT ?"
+        params = (after_user_id, limit)
+    else:
+        sql = ("SELECT u.user_id FROM users u WHERE u.user_id > ? AND NOT EXISTS "
+               "(SELECT 1 FROM broadcast_deliveries d WHERE d.job_id = ? AND d.user_id = u.user_id) "
+               "ORDER BY u.user_id ASC LIMIT ?")
+        params = (after_user_id, job_id, limit)
+    async with _read() as db:
+        async with db.execute(sql, params) as cursor:
+            return [r[0] for r in await cursor.fetchall()]
+
+async def checkpoint_broadcast_job(job_id, results, last_user_id, ledger=True):
+    """
+    Record a batch of (user_id, status) deliveries (only with `ledger`) and
+    move the job's checkpoint in one transaction. Returns the job's
+    (sent, failed) totals.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sent = sum(1 for _, st in results if st == "sent")
+    failed = len(results) - sent
+    async with _write() as db:
+        if ledger:
+            await db.executemany(
+                "INSERT OR IGNORE INTO broadcast_deliveries (job_id, user_id, status, delivered_at) VALUES (?, ?, ?, ?)",
+                [(job_id, uid, st, now) for uid, st in results]
+            )
+        await db.execute(
+            "UPDATE broadcast_jobs SET last_user_id = MAX(last_user_id, ?), sent = sent + ?, failed = failed + ?, "
+            "updated_at = ? WHERE id = ?",
+            (last_user_id, sent, failed, now, job_id)
+        )
+        async with db.execute("SELECT sent, failed FROM broadcast_jobs WHERE id = ?", (job_id,)) as cursor:
+            return tuple(await cursor.fetchone())
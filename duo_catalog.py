@@ -0,0 +1,54 @@
+"""
+Duolar katalogi xotirada: kod ichidagi (BUILTIN) duolar + bazadagi duolar.
+
+Har bir duoning o'zgarmas kaliti bor ("b0" - ichki, "d<id>" - bazadagi),
+shuning uchun admin duo o'chirganda foydalanuvchidagi eski tugmalar boshqa
+duoni ochib qo'ymaydi. Har bir o'zgarish `version` ni oshiradi - shu
+versiya bo'yicha tayyor menyularni keshlash mumkin.
+"""
+import logging
+
+from db import list_duos, add_duo, delete_duo
+
+log = logging.getLogger(__name__)
+
+
+class DuoCatalog:
+    def __init__(self, builtin: dict):
+        self.version = 0
+        self._builtin = [(f"b{i}", title, text) for i, (title, text) in enumerate(builtin.items())]
+        self._stored = []  # [(key, title, text)] bazadagi duolar, id bo'yicha
+        self._by_key = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._items = tuple(self._builtin + self._stored)
+        self._by_key = {key: (title, text) for key, title, text in self._items}
+        self.version += 1
+
+    async def load(self):
+        self._stored = [(f"d{id_}", title, text) for id_, title, text in await list_duos()]
+        self._rebuild()
+
+    def items(self):
+        """(key, title, text) in menu order: built-in first, then by id"""
+        return self._items
+
+    def get(self, key: str):
+        """(title, text) for a stable key, or None"""
+        return self._by_key.get(key)
+
+    async def add(self, title: str, text: str, added_by: int):
+        duo_id = await add_duo(title, text, added_by)
+        self._stored.append((f"d{duo_id}", title, text))
+        self._rebuild()
+        return duo_id
+
+    async def delete(self, duo_id: int):
+        """Delete a database duo; returns its title or None"""
+        title = await delete_duo(duo_id)
+        key = f"d{duo_id}"
+        if any(k == key for k, _, _ in self._stored):
+            self._stored = [row for row in self._stored if row[0] != key]
+            self._rebuild()
+        return title
@@ -0,0 +1,50 @@
+"""
+Ilova bo'yicha yagona aiohttp ClientSession.
+
+on_startup da ochiladi, on_shutdown da yopiladi. Keep-alive, DNS kesh va
+har bir host uchun ulanishlar limiti barcha tashqi so'rovlar uchun umumiy.
+"""
+import logging
+from typing import Optional
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 12                # sekund, bitta so'rov uchun
+HTTP_LIMIT = 50                  # umumiy ulanishlar
+HTTP_LIMIT_PER_HOST = 6          # bitta host uchun
+HTTP_DNS_TTL = 300               # sekund
+HTTP_KEEPALIVE = 60              # sekund
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; Bot/1.0)"}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def open_http():
+    """Create the shared session (idempotent)"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+        log.info("HTTP session ochildi")
+    return _session
+
+
+async def close_http():
+    """Close the shared session on shutdown"""
+    global _session
+    if _session is not None:
+        session, _session = _session, None
+        if not session.closed:
+            await session.close()
+        log.info("HTTP session yopildi")
@@ -0,0 +1,140 @@
+"""
+Namoz vaqtlarini tarmoqsiz, Quyosh holatidan hisoblash.
+
+O'zbekiston musulmonlari idorasi jadvallariga mos sozlamalar: bomdod
+va xufton uchun Quyoshning ufqdan 15.5° / 15° pastligi, asr Hanafiy
+mazhabi bo'yicha (soya = 2 x buyum + peshindagi soya), shomga 2 daqiqa
+ehtiyot qo'shiladi. Bir yillik jadval barcha viloyatlar uchun bir marta
+hisoblanadi va xotirada saqlanadi.
+"""
+import math
+from datetime import date, timedelta
+from typing import Optional
+
+FAJR_ANGLE = 15.5
+ISHA_ANGLE = 15.0
+ASR_SHADOW = 2            # Hanafiy; Shofe'iy uchun 1
+SUN_ANGLE = 0.833         # refraksiya + Quyosh radiusi
+UTC_OFFSET = 5            # Asia/Tashkent, yozgi vaqt yo'q
+ADJUST_MINUTES = {"peshin": 3, "shom": 2}
+
+# slug -> (kenglik, uzunlik); viloyat markazlari
+COORDINATES = {
+    "nukus": (42.4531, 59.6103),
+    "toshkent-shahri": (41.2995, 69.2401),
+    "toshkent": (41.2995, 69.2401),  # islom.uz jadvali bilan bir xil
+    "andijan": (40.7821, 72.3442),
+    "bukhara": (39.7747, 64.4286),
+    "samarqand": (39.6542, 66.9597),
+    "fergana": (40.3864, 71.7864),
+    "namangan": (40.9983, 71.6726),
+    "navoiy": (40.0844, 65.3792),
+    "qarshi": (38.8606, 65.7891),
+    "termez": (37.2242, 67.2783),
+    "gulistan": (40.4897, 68.7842),
+    "jizzakh": (40.1158, 67.8422),
+    "urgench": (41.5500, 60.6333),
+}
+
+# Tarmoq manbalari kalitlari -> bizning kalitlar (solishtirish uchun)
+KEY_ALIASES = {
+    "Fajr": "bomdod", "Sunrise": "quyosh", "Dhuhr": "peshin",
+    "Asr": "asr", "Maghrib": "shom", "Isha": "xufton",
+}
+
+_YEARS = {}  # year -> {slug: {YYYY-MM-DD: times}}
+
+
+def _sun_position(jd: float):
+    """(declination in radians, equation of time in hours) for a Julian day"""
+    d = jd - 2451545.0
+    g = math.radians((357.529 + 0.98560028 * d) % 360)
+    q = (280.459 + 0.98564736 * d) % 360
+    lam = math.radians(q + 1.915 * math.sin(g) + 0.020 * math.sin(2 * g))
+    eps = math.radians(23.439 - 0.00000036 * d)
+    ra = math.degrees(math.atan2(math.cos(eps) * math.sin(lam), math.cos(lam))) / 15
+    decl = math.asin(math.sin(eps) * math.sin(lam))
+    eqt = (q / 15 - ra % 24 + 12) % 24 - 12
+    return decl, eqt
+
+
+def _hhmm(hours: float, adjust: int = 0) -> str:
+    minutes = int(round(hours * 60)) + adjust
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"
+
+
+def _day_times(lat: float, lon: float, decl: float, eqt: float) -> dict:
+    noon = 12 - eqt + UTC_OFFSET - lon / 15
+    phi = math.radians(lat)
+    sin_d, cos_d = math.sin(decl), math.cos(decl)
+    sin_p, cos_p = math.sin(phi), math.cos(phi)
+
+    def hour_angle(altitude: float) -> float:
+        # Quyosh `altitude` (gradus) balandlikda bo'ladigan vaqtgacha soatlar
+        c = (math.sin(math.radians(altitude)) - sin_p * sin_d) / (cos_p * cos_d)
+        return math.degrees(math.acos(max(-1.0, min(1.0, c)))) / 15
+
+    asr_altitude = math.degrees(math.atan(1 / (ASR_SHADOW + math.tan(abs(phi - decl)))))
+    sunrise_sunset = hour_angle(-SUN_ANGLE)
+    raw = {
+        "bomdod": noon - hour_angle(-FAJR_ANGLE),
+        "quyosh": noon - sunrise_sunset,
+        "peshin": noon,
+        "asr": noon + hour_angle(asr_altitude),
+        "shom": noon + sunrise_sunset,
+        "xufton": noon + hour_angle(-ISHA_ANGLE),
+    }
+    return {k: _hhmm(v, ADJUST_MINUTES.get(k, 0)) for k, v in raw.items()}
+
+
+def _julian_noon(day: date, lon: float) -> float:
+    return day.toordinal() + 1721425.0 - lon / 360
+
+
+def compute_day(lat: float, lon: float, day: date) -> dict:
+    """Six prayer times ("HH:MM", local time) for one place and day"""
+    return _day_times(lat, lon, *_sun_position(_julian_noon(day, lon)))
+
+
+def compute_year(year: int) -> dict:
+    """{slug: {YYYY-MM-DD: times}} for every day of `year` and every region"""
+    first = date(year, 1, 1)
+    days = [first + timedelta(days=i) for i in range((date(year + 1, 1, 1) - first).days)]
+    # Quyosh holati kuniga bir marta (O'zbekiston o'rtasi uchun) hisoblanadi:
+    # viloyatlar orasidagi farq og'ish burchagida 0.01° dan kam
+    sun = [(d.isoformat(), _sun_position(_julian_noon(d, 66.0))) for d in days]
+    table = {}
+    by_coords = {}
+    for slug, coords in COORDINATES.items():
+        if coords not in by_coords:
+            lat, lon = coords
+            by_coords[coords] = {day: _day_times(lat, lon, decl, eqt) for day, (decl, eqt) in sun}
+        table[slug] = by_coords[coords]
+    return table
+
+
+def calculated_times(region_slug: str, day: date) -> Optional[dict]:
+    """Times for a region/day from the in-memory year table, None for unknown slugs"""
+    if region_slug not in COORDINATES:
+        return None
+    table = _YEARS.get(day.year)
+    if table is None:
+        table = _YEARS[day.year] = compute_year(day.year)
+    return table[region_slug][day.isoformat()]
+
+
+def max_drift(calculated: dict, other: dict) -> Optional[int]:
+    """Largest difference in minutes between two time dicts (any key style)"""
+    worst = None
+    for key, value in other.items():
+        key = KEY_ALIASES.get(key, key)
+        if key not in calculated or not isinstance(value, str):
+            continue
+        try:
+            h1, m1 = map(int, calculated[key].split(":"))
+            h2, m2 = map(int, value[:5].split(":"))
+        except ValueError:
+            continue
+        diff = abs((h1 * 60 + m1) - (h2 * 60 + m2))
+        worst = diff if worst is None else max(worst, diff)
+    return worst
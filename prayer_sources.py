@@ -0,0 +1,372 @@
+"""
+Namoz vaqtlari manbalari (islom.uz, namoz-vaqti.uz, AlAdhan).
+
+Har bir manbaning o'z circuit breaker'i, parallellik limiti va kechikish
+statistikasi bor. SourcePipeline manbalarni navbat bilan ishlatadi:
+ishlamayotgan hostlar o'tkazib yuboriladi, joriy manba odatdagi
+kechikishdan (percentile) uzoq javob bermasa, keyingisi parallel
+(hedged) ishga tushiriladi va birinchi muvaffaqiyatli javob olinadi.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Optional
+
+from cache import SingleFlight
+from http_client import open_http
+
+log = logging.getLogger(__name__)
+
+
+class SourceError(Exception):
+    """The source host answered badly (non-200, broken payload)"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` seconds (one trial request);
+    a successful trial closes it again, a failed one re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_running = False
+
+    def release_trial(self):
+        """A half-open trial was cancelled before it produced a verdict"""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                log.warning("Circuit breaker ochildi (%s ketma-ket xato)", self.failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class SourceMetrics:
+    """Request/error counters and a window of recent latencies"""
+
+    def __init__(self, window: int = 200):
+        self.requests = 0
+        self.successes = 0
+        self.empty = 0
+        self.errors = 0
+        self.skipped = 0
+        self.hedges = 0
+        self.latencies = deque(maxlen=window)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * (len(ordered) - 1) + 0.5))]
+
+    def snapshot(self):
+        p50 = self.percentile(0.5)
+        p90 = self.percentile(0.9)
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "empty": self.empty,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "hedges": self.hedges,
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p90": round(p90, 3) if p90 is not None else None,
+        }
+
+
+class PrayerSource:
+    """
+    Base class. `fetch` returns (regions, {YYYY-MM-DD: times}) or None when
+    the source has no data; it raises on transport/host errors.
+    """
+
+    name = "source"
+
+    def __init__(self, concurrency: int = 4, breaker: Optional[CircuitBreaker] = None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = SourceMetrics()
+
+    def covers(self, region_slug: str, day: date) -> bool:
+        return True
+
+    async def fetch(self, region_slug: str, day: date):
+        raise NotImplementedError
+
+    async def run(self, region_slug: str, day: date):
+        """fetch() with concurrency limit, metrics and breaker bookkeeping; never raises"""
+        async with self.semaphore:
+            self.metrics.requests += 1
+            started = time.monotonic()
+            try:
+                result = await self.fetch(region_slug, day)
+            except asyncio.CancelledError:
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                self.metrics.errors += 1
+                self.breaker.record_failure()
+                log.warning("%s failed for %s %s: %s", self.name, region_slug, day, e)
+                return None
+            self.metrics.latencies.append(time.monotonic() - started)
+            self.breaker.record_success()
+            if result:
+                self.metrics.successes += 1
+            else:
+                self.metrics.empty += 1
+            return result
+
+
+# ---------------- islom.uz ----------------
+LABEL_TO_KEY = {
+    "Тонг": "bomdod",
+    "Қуёш": "quyosh",
+    "Пешин": "peshin",
+    "Аср": "asr",
+    "Шом": "shom",
+    "Хуфтон": "xufton",
+}
+
+
+def parse_islom_html(text: str):
+    idx = text.find("Намоз вақтлари")
+    if idx == -1:
+        idx = text.find("Namoz vaqtlari")
+    snippet = text[idx: idx + 3500] if idx != -1 else text[:3500]
+    s = re.sub(r"\s+", " ", snippet)
+
+    result = {}
+    for label in ["Тонг", "Қуёш", "Пешин", "Аср", "Шом", "Хуфтон"]:
+        pos = s.find(label)
+        if pos == -1:
+            pos = s.find(label.capitalize())
+        if pos == -1:
+            continue
+        start = max(0, pos - 120)
+        fragment = s[start: pos + len(label) + 40]
+        m = re.search(r"(\d{1,2}:\d{2}(?::\d{2})?)", fragment)
+        if m:
+            time_raw = m.group(1)
+            hh, mm, *_ = time_raw.split(":")
+            hhmm = f"{int(hh):02d}:{int(mm):02d}"
+            key = LABEL_TO_KEY.get(label, label)
+            result[key] = hhmm
+
+    # fallback: pick first 6 times if not all found
+    if len(result) < 6:
+        times = re.findall(r"\b(\d{1,2}:\d{2})(?::\d{2})?\b", s)
+        filtered = [t for t in times if t != "00:00"]
+        uniq = []
+        for t in filtered:
+            if t not in uniq:
+                uniq.append(t)
+            if len(uniq) >= 6:
+                break
+        need = ['bomdod','quyosh','peshin','asr','shom','xufton']
+        if len(uniq) >= 6:
+            for i, k in enumerate(need):
+                result[k] = uniq[i]
+
+    if result.get('bomdod') and result.get('xufton'):
+        return result
+    return None
+
+
+class IslomSource(PrayerSource):
+    """Scrapes today's Tashkent times from the islom.uz front page"""
+
+    name = "islom.uz"
+
+    def __init__(self, url: str, regions: tuple, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.regions = tuple(regions)
+        self._flights = SingleFlight()  # ikkala Toshkent slugi bitta sahifani kutadi
+
+    def covers(self, region_slug: str, day: date) -> bool:
+        # Sahifada faqat bugungi Toshkent vaqti bor
+        return region_slug in self.regions and day == datetime.now().date()
+
+    async def fetch(self, region_slug: str, day: date):
+        return await self._flights.do(day, lambda: self._fetch_page(day))
+
+    async def _fetch_page(self, day: date):
+        s = await open_http()
+        async with s.get(self.url) as resp:
+            if resp.status != 200:
+                raise SourceError(f"status {resp.status}")
+            text = await resp.text()
+        parsed = parse_islom_html(text)
+        if not parsed:
+            return None
+        return self.regions, {day.isoformat(): parsed}
+
+
+# ---------------- namoz-vaqti.uz ----------------
+def parse_period_table(table: list):
+    """namoz-vaqti.uz period_table -> {YYYY-MM-DD: times}"""
+    parsed = {}
+    for entry in table:
+        times = entry.get("times")
+        try:
+            day = datetime.strptime(entry.get("date") or "", "%d.%m.%Y").strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+        if times:
+            parsed[day] = times
+    return parsed
+
+
+class NamozVaqtiSource(PrayerSource):
+    """Month table per region; every day of the month is returned at once"""
+
+    name = "namoz-vaqti.uz"
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    async def fetch(self, region_slug: str, day: date):
+        params = {"format": "json", "region": region_slug, "period": day.strftime("%Y-%m")}
+        s = await open_http()
+        async with s.get(self.base_url, params=params) as resp:
+            if resp.status != 200:
+                raise SourceError(f"status {resp.status}")
+            j = await resp.json(content_type=None)
+        month = parse_period_table(j.get("period_table") or [])
+        day_str = day.isoformat()
+        today = j.get("today")
+        # "today" bloki faqat bugungi sana uchun - boshqa sanaga yozilsa 35 kun noto'g'ri vaqt saqlanadi
+        if day_str not in month and day == datetime.now().date() and today and "times" in today:
+            month[day_str] = today["times"]
+        if day_str not in month:
+            return None
+        return (region_slug,), month
+
+
+# ---------------- AlAdhan ----------------
+class AladhanSource(PrayerSource):
+    name = "aladhan"
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    async def fetch(self, region_slug: str, day: date):
+        params = {
+            "city": region_slug or "Tashkent",
+            "country": "Uzbekistan",
+            "method": 2,
+            "date": day.strftime("%d-%m-%Y")
+        }
+        s = await open_http()
+        async with s.get(self.base_url, params=params) as resp:
+            if resp.status != 200:
+                raise SourceError(f"status {resp.status}")
+            j = await resp.json(content_type=None)
+        timings = (j.get("data") or {}).get("timings")
+        if not timings:
+            return None
+        return (region_slug,), {day.isoformat(): timings}
+
+
+# ---------------- PIPELINE ----------------
+class SourcePipeline:
+    """
+    Tries sources in priority order. Open circuits are skipped. If the
+    running source is slower than its `hedge_percentile` latency (or
+    `default_delay` before there is enough history), the next source is
+    started in parallel; the first non-empty answer wins and the rest are
+    cancelled. Returns (source_name, regions, {YYYY-MM-DD: times}) or None.
+    """
+
+    def __init__(self, sources, hedge_percentile: float = 0.9,
+                 default_delay: float = 3.0, min_delay: float = 0.2, min_samples: int = 5):
+        self.sources = list(sources)
+        self.hedge_percentile = hedge_percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+    def hedge_delay(self, source: PrayerSource) -> float:
+        if len(source.metrics.latencies) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, source.metrics.percentile(self.hedge_percentile))
+
+    async def fetch(self, region_slug: str, day: date):
+        candidates = [s for s in self.sources if s.covers(region_slug, day)]
+        running = {}  # task -> source
+        position = 0
+
+        def launch_next():
+            nonlocal position
+            while position < len(candidates):
+                source = candidates[position]
+                position += 1
+                if not source.breaker.allow():
+                    source.metrics.skipped += 1
+                    continue
+                running[asyncio.ensure_future(source.run(region_slug, day))] = source
+                return source
+            return None
+
+        last = launch_next()
+        try:
+            while running:
+                timeout = self.hedge_delay(last) if position < len(candidates) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = launch_next()
+                    if hedged:
+                        hedged.metrics.hedges += 1
+                        last = hedged
+                    continue
+                for task in done:
+                    source = running.pop(task)
+                    result = task.result()
+                    if result:
+                        regions, entries = result
+                        return source.name, regions, entries
+                if not running:
+                    last = launch_next() or last
+            return None
+        finally:
+            for task in running:
+                task.cancel()
+
+    def metrics(self):
+        """{source_name: counters + latency percentiles + breaker state}"""
+        out = {}
+        for s in self.sources:
+            snap = s.metrics.snapshot()
+            snap["breaker"] = s.breaker.state
+            out[s.name] = snap
+        return out
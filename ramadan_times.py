@@ -1,6 +1,23 @@
 
 # Ramazon taqvimi 2026 (Toshkent vaqti bilan)
 # Boshqa viloyatlar uchun farqlar (daqiqa) qo'shiladi yoki alohida yoziladi.
+#
+# Keyingi yillar RAMADAN_DATA_FILE (JSON) dan qo'shiladi:
+# {"2027": {"tashkent": {"2027-02-08": {"bomdod": "06:01", "shom": "17:55"}, ...},
+#           "offsets": {"termez": {"sah": 9, "ift": 9}}}}
+# "offsets" ixtiyoriy, berilmagan viloyatlar uchun REGION_OFFSETS ishlatiladi.
+# Jadval importda bir marta (viloyat x kun) daqiqalar massiviga aylantiriladi.
+import json
+import logging
+import os
+from array import array
+
+log = logging.getLogger(__name__)
+
+RAMADAN_DATA_FILE = os.getenv(
+    "RAMADAN_DATA_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ramadan_times.json")
+)
+DEFAULT_REGION = "toshkent"
 
 RAMADAN_2026_TASHKENT = {
     "2026-02-19": {"bomdod": "05:54", "shom": "18:03"},
@@ -53,30 +70,83 @@ REGION_OFFSETS = {
     "termez": {"sah": 8, "ift": 8}, # Termiz farqi faslga qarab o'zgaradi, aniqlashtirish kerak
 }
 
-def get_ramadan_times(region_slug, date_str):
+def _to_minutes(time_str):
+    h, m = map(int, time_str.split(':'))
+    return h * 60 + m
+
+def _render(minutes):
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"
+
+def _load_years():
+    """[(tashkent_table, offsets)] - built-in 2026 plus years from RAMADAN_DATA_FILE"""
+    years = [(RAMADAN_2026_TASHKENT, REGION_OFFSETS)]
+    if not os.path.exists(RAMADAN_DATA_FILE):
+        return years
+    try:
+        with open(RAMADAN_DATA_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        years_in_file = sorted(data)
+    except Exception as e:
+        log.exception("Ramazon jadvali %s o'qilmadi: %s", RAMADAN_DATA_FILE, e)
+        return years
+    for year in years_in_file:
+        try:
+            entry = data[year]
+            candidate = (entry["tashkent"], {**REGION_OFFSETS, **entry.get("offsets", {})})
+            _build([candidate])  # buzuq yil import paytida butun modulni yiqitmasin
+        except Exception as e:
+            log.error("Ramazon jadvali %s: %s yili o'tkazib yuborildi (%r)", RAMADAN_DATA_FILE, year, e)
+            continue
+        years.append(candidate)
+    return years
+
+def _build(years):
     """
-    Berilgan sana va va hudud uchun saharlik va iftorlik vaqtini qaytaradi.
-    Agar aniq jadval bo'lmasa, Toshkent vaqtiga offset qo'shib hisoblaydi.
+    DAY_INDEX: YYYY-MM-DD -> ustun; MINUTES: slug -> (saharlik, iftorlik)
+    daqiqalar massivi; RENDERED: slug -> har bir kun uchun tayyor dict.
     """
-    if date_str not in RAMADAN_2026_TASHKENT:
+    rows = {}  # sana -> {slug: (sah, ift)}
+    for tashkent, offsets in years:
+        for day, base in tashkent.items():
+            try:
+                sah, ift = _to_minutes(base["bomdod"]), _to_minutes(base["shom"])
+            except (KeyError, ValueError, AttributeError):
+                log.warning("Ramazon jadvalida noto'g'ri qator: %s %s", day, base)
+                continue
+            rows[day] = {
+                slug: ((sah + off["sah"]) % 1440, (ift + off["ift"]) % 1440)
+                for slug, off in offsets.items()
+            }
+    days = sorted(rows)
+    slugs = sorted({slug for row in rows.values() for slug in row})
+    minutes, rendered = {}, {}
+    for slug in slugs:
+        # Yil bo'yicha offsets'da viloyat bo'lmasa, Toshkent vaqti olinadi
+        pairs = [rows[d].get(slug, rows[d][DEFAULT_REGION]) for d in days]
+        minutes[slug] = (array("H", (p[0] for p in pairs)), array("H", (p[1] for p in pairs)))
+        rendered[slug] = tuple({"bomdod": _render(sah), "shom": _render(ift)} for sah, ift in pairs)
+    return {d: i for i, d in enumerate(days)}, minutes, rendered
+
+try:
+    DAY_INDEX, MINUTES, RENDERED = _build(_load_years())
+except Exception as e:
+    log.exception("Ramazon jadvali qurilmadi, ichki 2026 jadvali ishlatiladi: %s", e)
+    DAY_INDEX, MINUTES, RENDERED = _build([(RAMADAN_2026_TASHKENT, REGION_OFFSETS)])
+
+def ramadan_minutes(region_slug, date_str):
+    """(saharlik, iftorlik) daqiqalarda (00:00 dan), jadvalda bo'lmasa None"""
+    col = DAY_INDEX.get(date_str)
+    if col is None:
         return None
-    
-    base_times = RAMADAN_2026_TASHKENT[date_str]
-    offset = REGION_OFFSETS.get(region_slug, {"sah": 0, "ift": 0})
-    
-    # Vaqtlarni hisoblash
-    def calc_time(time_str, delta_min):
-        if not time_str: return "00:00"
-        try:
-            h, m = map(int, time_str.split(':'))
-            total_min = h * 60 + m + delta_min
-            new_h = (total_min // 60) % 24
-            new_m = total_min % 60
-            return f"{new_h:02d}:{new_m:02d}"
-        except:
-            return time_str
+    sah, ift = MINUTES.get(region_slug) or MINUTES[DEFAULT_REGION]
+    return sah[col], ift[col]
 
-    return {
-        "bomdod": calc_time(base_times["bomdod"], offset["sah"]),
-        "shom": calc_time(base_times["shom"], offset["ift"])
-    }
+def get_ramadan_times(region_slug, date_str):
+    """
+    Berilgan sana va hudud uchun saharlik va iftorlik vaqtini qaytaradi.
+    Noma'lum hudud uchun Toshkent vaqti. Qaytgan dict umumiy - o'zgartirmang.
+    """
+    col = DAY_INDEX.get(date_str)
+    if col is None:
+        return None
+    return (RENDERED.get(region_slug) or RENDERED[DEFAULT_REGION])[col]
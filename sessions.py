@@ -0,0 +1,102 @@
+"""
+Foydalanuvchi/chat bo'yicha ish vaqtidagi holat (xabarlar navbati,
+debounce vaqtlari, video holati) uchun bitta ixcham yozuv.
+
+Yozuvlar __slots__ bilan, ombor esa LRU tartibidagi OrderedDict:
+`idle_ttl` dan ko'p harakatsiz turgan yoki `maxsize` dan oshgan eng eski
+yozuvlar chiqariladi. Chiqarilgan yozuv keyingi murojaatda bo'sh holda
+qayta yaratiladi - bu faqat kesh, muhim ma'lumot bazada.
+"""
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class Session:
+    __slots__ = (
+        "msg_ids",             # oxirgi yuborilgan xabarlar (eng eskisi birinchi)
+        "last_callback",       # oxirgi callback data (debounce)
+        "last_callback_at",
+        "last_start_at",       # /start debounce
+        "throttle_at",         # ThrottleMiddleware guruhlari bo'yicha oxirgi bosish vaqtlari
+        "video_index",         # joriy video indeksi (tur ichida)
+        "video_message_id",    # tahrirlanadigan video xabari
+        "video_kind",
+        "autoplay",
+        "touched",
+    )
+
+    def __init__(self, now: float):
+        self.msg_ids = []
+        self.last_callback = None
+        self.last_callback_at = 0.0
+        self.last_start_at = 0.0
+        self.throttle_at = None
+        self.video_index = 0
+        self.video_message_id = None
+        self.video_kind = "short"
+        self.autoplay = False
+        self.touched = now
+
+
+class SessionStore:
+    """id -> Session with idle-TTL and size-bound LRU eviction"""
+
+    def __init__(self, maxsize: int, idle_ttl: float):
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self._data = OrderedDict()
+        self.idle_evictions = 0
+        self.overflow_evictions = 0
+
+    def _evict_idle(self, now: float):
+        # Eng uzoq ishlatilmaganlar boshida turadi, birinchi tirik yozuvda to'xtaymiz
+        deadline = now - self.idle_ttl
+        while self._data:
+            key, session = next(iter(self._data.items()))
+            if session.touched > deadline:
+                break
+            del self._data[key]
+            self.idle_evictions += 1
+
+    def get(self, key: Hashable) -> Session:
+        """Session for `key`, created if missing; marks it as used"""
+        now = time.monotonic()
+        session = self._data.get(key)
+        if session is None:
+            self._evict_idle(now)
+            session = self._data[key] = Session(now)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.overflow_evictions += 1
+        else:
+            session.touched = now
+            self._data.move_to_end(key)
+        return session
+
+    def peek(self, key: Hashable, touch: bool = False) -> Optional[Session]:
+        """Existing session or None; never creates one"""
+        session = self._data.get(key)
+        if session is not None and touch:
+            session.touched = time.monotonic()
+            self._data.move_to_end(key)
+        return session
+
+    def sweep(self):
+        self._evict_idle(time.monotonic())
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def evictions(self):
+        return self.idle_evictions + self.overflow_evictions
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+            "overflow_evictions": self.overflow_evictions,
+        }
@@ -0,0 +1,178 @@
+"""
+Manbalar zanjiri (hedging, circuit breaker) va stale-while-revalidate
+mahalliy aiohttp stub server bilan tekshiriladi - tashqi tarmoq kerak emas.
+"""
+import asyncio
+import inspect
+import time
+from datetime import date, datetime
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import db
+from http_client import close_http
+from prayer_sources import AladhanSource, CircuitBreaker, NamozVaqtiSource, SourcePipeline
+
+DAY = date(2026, 5, 10)
+OLD_TIMES = {"bomdod": "03:50", "shom": "19:30"}
+NEW_TIMES = {"bomdod": "03:49", "shom": "19:31"}
+
+
+def month_payload(times):
+    return {"period_table": [{"date": DAY.strftime("%d.%m.%Y"), "times": times}]}
+
+
+class Stub:
+    """
+    Stub hosts: /slow, /aladhan, /flaky (fails while `healthy` is False),
+    /gated (waits for `gate`), /today (only a "today" block, no table)
+    """
+
+    def __init__(self):
+        self.healthy = False
+        self.hits = {}
+        self.gate = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/slow", self.slow)
+        app.router.add_get("/aladhan", self.aladhan)
+        app.router.add_get("/flaky", self.flaky)
+        app.router.add_get("/gated", self.gated)
+        app.router.add_get("/today", self.today)
+        self.server = TestServer(app)
+
+    def url(self, path):
+        return str(self.server.make_url(path))
+
+    def _hit(self, request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+
+    async def slow(self, request):
+        self._hit(request)
+        await asyncio.sleep(5)
+        return web.json_response(month_payload(OLD_TIMES))
+
+    async def aladhan(self, request):
+        self._hit(request)
+        return web.json_response({"data": {"timings": {"Fajr": "03:51", "Maghrib": "19:29"}}})
+
+    async def flaky(self, request):
+        self._hit(request)
+        if not self.healthy:
+            return web.Response(status=500)
+        return web.json_response(month_payload(NEW_TIMES))
+
+    async def gated(self, request):
+        self._hit(request)
+        await self.gate.wait()
+        return web.json_response(month_payload(NEW_TIMES))
+
+    async def today(self, request):
+        self._hit(request)
+        return web.json_response({"period_table": [], "today": {"times": NEW_TIMES}})
+
+
+def with_stub(test):
+    """Run an async test with a started Stub; other test arguments stay pytest fixtures"""
+    def run(**fixtures):
+        async def runner():
+            stub = Stub()
+            await stub.server.start_server()
+            try:
+                await test(stub, **fixtures)
+            finally:
+                await close_http()
+                await stub.server.close()
+        asyncio.run(runner())
+
+    signature = inspect.signature(test)
+    run.__signature__ = signature.replace(parameters=list(signature.parameters.values())[1:])
+    run.__name__ = test.__name__
+    return run
+
+
+@with_stub
+async def test_slow_primary_is_hedged(stub):
+    primary = NamozVaqtiSource(stub.url("/slow"))
+    secondary = AladhanSource(stub.url("/aladhan"))
+    pipeline = SourcePipeline([primary, secondary], default_delay=0.1)
+
+    started = time.monotonic()
+    name, regions, entries = await pipeline.fetch("toshkent", DAY)
+
+    assert name == "aladhan"
+    assert entries[DAY.isoformat()]["Fajr"] == "03:51"
+    assert time.monotonic() - started < 2
+    assert secondary.metrics.hedges == 1
+    assert stub.hits == {"/slow": 1, "/aladhan": 1}
+
+
+@with_stub
+async def test_breaker_opens_and_recovers_through_trial(stub):
+    source = NamozVaqtiSource(stub.url("/flaky"), breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    pipeline = SourcePipeline([source])
+
+    for _ in range(3):
+        assert await pipeline.fetch("andijan", DAY) is None
+    assert source.breaker.state == "open"
+
+    # Ochiq zanjir hostga murojaat qilmaydi
+    assert await pipeline.fetch("andijan", DAY) is None
+    assert stub.hits["/flaky"] == 3
+    assert source.metrics.skipped == 1
+
+    # Yarim ochiq sinov muvaffaqiyatsiz bo'lsa - yana ochiladi
+    await asyncio.sleep(0.25)
+    assert await pipeline.fetch("andijan", DAY) is None
+    assert source.breaker.state == "open"
+    assert stub.hits["/flaky"] == 4
+
+    stub.healthy = True
+    await asyncio.sleep(0.25)
+    name, _, entries = await pipeline.fetch("andijan", DAY)
+    assert name == "namoz-vaqti.uz"
+    assert entries[DAY.isoformat()] == NEW_TIMES
+    assert source.breaker.state == "closed"
+    assert source.breaker.failures == 0
+
+
+@with_stub
+async def test_stale_entry_is_served_while_refreshing(stub, tmp_path, monkeypatch):
+    import bot
+
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "bot.db"))
+    monkeypatch.setattr(bot, "PRAYER_PIPELINE", SourcePipeline([NamozVaqtiSource(stub.url("/gated"))]))
+    await db.open_db()
+    await db.init_db([])
+    key = ("andijan", DAY.isoformat())
+    try:
+        # Muddati o'tgan, lekin PRAYER_MAX_STALE ichidagi yozuv
+        bot.PRAYER_CACHE.put(key, ("namoz-vaqti.uz", OLD_TIMES), ttl=60, stored_at=time.time() - 120)
+
+        times = await asyncio.wait_for(bot.fetch_prayer_network("andijan", DAY), timeout=1)
+        assert times == OLD_TIMES
+        refresh = bot.PRAYER_REVALIDATIONS[key]
+
+        # Yangilanish kutilayotganda keyingi so'rovlar ham eski qiymatni oladi va yangi so'rov ochmaydi
+        assert await asyncio.wait_for(bot.fetch_prayer_network("andijan", DAY), timeout=1) == OLD_TIMES
+        await asyncio.sleep(0.05)
+        assert stub.hits["/gated"] == 1
+
+        stub.gate.set()
+        await asyncio.wait_for(refresh, timeout=2)
+        assert key not in bot.PRAYER_REVALIDATIONS
+        assert bot.PRAYER_CACHE.get(key) == ("namoz-vaqti.uz", NEW_TIMES)
+        assert await bot.fetch_prayer_network("andijan", DAY) == NEW_TIMES
+    finally:
+        bot.PRAYER_CACHE.pop(key)
+        await db.close_db()
+
+
+@with_stub
+async def test_today_block_is_not_stored_under_other_dates(stub):
+    source = NamozVaqtiSource(stub.url("/today"))
+    today = datetime.now().date()
+
+    assert await source.fetch("andijan", DAY) is None
+    regions, entries = await source.fetch("andijan", today)
+    assert entries == {today.isoformat(): NEW_TIMES}
@@ -0,0 +1,88 @@
+"""
+Callback tugmalari uchun tashqi (outer) debounce/throttle middleware.
+
+Handler, filtrlar va DB kodidan oldin ishlaydi:
+- bir xil callback data `duplicate_window` ichida qayta kelsa tashlanadi;
+- prefikslar guruhi (masalan video tugmalari) uchun guruhdagi istalgan
+  tugma o'z oynasi ichida qayta bosilsa tashlanadi.
+Vaqtlar foydalanuvchi sessiyasida ixcham massivda saqlanadi, tashlangan
+yangilanishlar sabab bo'yicha sanaladi.
+"""
+import logging
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from sessions import SessionStore
+
+log = logging.getLogger(__name__)
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    `groups` is a sequence of (name, prefixes, seconds): a callback whose
+    data starts with any of `prefixes` is dropped if the same user pressed
+    any button of that group less than `seconds` ago.
+    """
+
+    def __init__(self, sessions: SessionStore, duplicate_window: float,
+                 groups: Sequence[Tuple[str, Tuple[str, ...], float]] = ()):
+        self.sessions = sessions
+        self.duplicate_window = duplicate_window
+        self.groups = tuple(groups)
+        self._prefix_group = {}
+        for i, (_, prefixes, _) in enumerate(self.groups):
+            for prefix in prefixes:
+                self._prefix_group[prefix] = i
+        self.passed = 0
+        self.shed = {"duplicate": 0}
+        for name, _, _ in self.groups:
+            self.shed[name] = 0
+
+    def _group_of(self, data: str):
+        # Prefikslar "nom:" ko'rinishida - birinchi ":" gacha bo'lgan qism bilan O(1)
+        head, sep, _ = data.partition(":")
+        return self._prefix_group.get(head + sep)
+
+    def check(self, user_id: int, data: str):
+        """Reason the callback should be shed, or None to let it through"""
+        now = time.monotonic()
+        session = self.sessions.get(user_id)
+        if session.last_callback == data and now - session.last_callback_at < self.duplicate_window:
+            return "duplicate"
+        group = self._group_of(data)
+        if group is not None:
+            stamps = session.throttle_at
+            if stamps is None:
+                stamps = session.throttle_at = array("d", bytes(8 * len(self.groups)))
+            if now - stamps[group] < self.groups[group][2]:
+                return self.groups[group][0]
+            stamps[group] = now
+        session.last_callback = data
+        session.last_callback_at = now
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if isinstance(event, CallbackQuery) and user and event.data:
+            reason = self.check(user.id, event.data)
+            if reason:
+                self.shed[reason] += 1
+                try:
+                    await event.answer()  # tugmadagi "soat" belgisi yo'qolsin
+                except Exception:
+                    pass
+                return None
+        self.passed += 1
+        return await handler(event, data)
+
+    def stats(self):
+        return {"passed": self.passed, "shed": dict(self.shed)}
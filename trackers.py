@@ -0,0 +1,88 @@
+"""
+Write-behind buferlar.
+
+Tez-tez o'zgaradigan qiymatlar (userlarning oxirgi faolligi, duolar
+ochilishi soni) xotirada yig'iladi va fon vazifasi ularni bitta tranzaksiyada SQLite'ga yozadi.
+"""
+import logging
+from datetime import datetime
+
+from db import touch_users, add_duo_opens
+
+log = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """Dirty set of users seen since the last flush"""
+
+    def __init__(self):
+        self._dirty = {}  # user_id -> (first_name, username, last_active)
+
+    def touch(self, user_id: int, first_name: str = None, username: str = None):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._dirty[user_id] = (first_name, username, now)
+
+    def __len__(self):
+        return len(self._dirty)
+
+    async def flush(self):
+        """Write all pending activity with one executemany; returns row count"""
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+        rows = [(uid, first, username, ts) for uid, (first, username, ts) in batch.items()]
+        try:
+            await touch_users(rows)
+        except Exception:
+            # Yozilmagan yozuvlarni qaytaramiz (yangilari ustun)
+            for uid, entry in batch.items():
+                self._dirty.setdefault(uid, entry)
+            raise
+        return len(rows)
+
+
+class DuoOpenCounter:
+    """Aggregates duo opens in memory until the next flush"""
+
+    def __init__(self):
+        self._deltas = {}  # name -> [opens, last_opened]
+        self._flushing = {}  # hozir bazaga yozilayotgan partiya
+
+    def incr(self, name: str):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry = self._deltas.get(name)
+        if entry:
+            entry[0] += 1
+            entry[1] = now
+        else:
+            self._deltas[name] = [1, now]
+
+    def discard(self, name: str):
+        """Drop pending opens of a deleted duo"""
+        self._deltas.pop(name, None)
+        self._flushing.pop(name, None)
+
+    def pending(self):
+        """{name: opens} not yet committed, including a batch being flushed right now"""
+        out = {name: entry[0] for name, entry in self._flushing.items()}
+        for name, entry in self._deltas.items():
+            out[name] = out.get(name, 0) + entry[0]
+        return out
+
+    async def flush(self):
+        """Write all deltas in one transaction; returns number of duos updated"""
+        if not self._deltas:
+            return 0
+        batch, self._deltas = self._deltas, {}
+        self._flushing = batch
+        rows = [(name, opens, ts) for name, (opens, ts) in batch.items()]
+        try:
+            await add_duo_opens(rows)
+        except Exception:
+            for name, (opens, ts) in batch.items():
+                entry = self._deltas.setdefault(name, [0, ts])
+                entry[0] += opens
+            raise
+        finally:
+            self._flushing = {}
+        return len(rows)
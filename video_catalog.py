@@ -0,0 +1,54 @@
+"""
+Videolar uchun xotiradagi katalog (manba - SQLite `videos` jadvali).
+
+Jadval startupda bir marta o'qiladi va tur (short/long) bo'yicha
+indekslanadi, shuning uchun navigatsiya tugmalari bazaga murojaat
+qilmaydi. Barcha yozuvlar shu katalog orqali tranzaksiyada bajariladi
+va indeks darhol qayta quriladi.
+"""
+import logging
+
+from db import list_videos, add_video, remove_video_at, move_video
+
+log = logging.getLogger(__name__)
+
+
+class VideoCatalog:
+    """Videos in list order plus per-kind playlists (tuples, shared - do not mutate)"""
+
+    def __init__(self):
+        self._videos = ()
+        self._by_kind = {}
+
+    async def load(self):
+        videos = await list_videos()
+        by_kind = {}
+        for v in videos:
+            by_kind.setdefault(v["kind"], []).append(v)
+        self._videos = tuple(videos)
+        self._by_kind = {kind: tuple(items) for kind, items in by_kind.items()}
+
+    def all(self):
+        return self._videos
+
+    def playlist(self, kind: str):
+        return self._by_kind.get(kind, ())
+
+    async def add(self, file_id: str, duration: int, kind: str) -> int:
+        """Append a video and return its 1-based position"""
+        pos = await add_video(file_id, duration, kind)
+        await self.load()
+        return pos
+
+    async def remove(self, pos: int):
+        """Remove the video at 1-based `pos`; returns it, or None if out of range"""
+        removed = await remove_video_at(pos)
+        if removed:
+            await self.load()
+        return removed
+
+    async def move(self, from_pos: int, to_pos: int) -> bool:
+        moved = await move_video(from_pos, to_pos)
+        if moved:
+            await self.load()
+        return moved